@@ -1,170 +1,67 @@
+import hashlib
+import json
+import threading
+from typing import TYPE_CHECKING, Dict, List
+
 import streamlit as st
-from src.agent import Agent
-from src.memory import Memory
-import random
-from typing import Dict, Any
+from src.coach import REPLY_CACHE, generate_personalized_plans
+from src.results import to_plain
+
+if TYPE_CHECKING:
+    from src.agent import Agent
 
 # -----------------------------
-# UTIL: Personalized Plan Generator
+# SHARED RESOURCES (survive reruns, shared by all sessions)
 # -----------------------------
-def generate_personalized_plans(snapshot: Dict[str, Any], agent_result: Dict[str, Any]) -> Dict[str, str]:
-    """
-    Create personalized short messages for each domain using snapshot values and agent outputs.
-    Returns dictionary with keys: health, finance, learning, productivity -> short message strings.
-    """
-    plans = {}
-
-    # ----- HEALTH -----
-    health_snap = snapshot.get("health", {})
-    steps = health_snap.get("steps_per_day", 0)
-    sleep = health_snap.get("sleep_hours", 0)
-    stress = health_snap.get("stress_level", "low")
-    health_plan_list = agent_result.get("health", {}).get("plan", [])
-    # Personalize
-    health_msgs = []
-    if steps and steps < 5000:
-        health_msgs.append(f"Increase daily steps: you have {steps} steps — aim for +20% or a 20–30 min walk.")
-    else:
-        health_msgs.append(f"Your steps ({steps}) look decent — keep the routine.")
-    if sleep and sleep < 7:
-        health_msgs.append(f"Improve sleep: you average {sleep}h — aim for consistent 7–8h schedule.")
-    if stress in ("high",):
-        health_msgs.append("Stress is high — try short breathing breaks (3–5 min) twice daily.")
-    if health_plan_list:
-        health_msgs.append("Actions: " + " • ".join(health_plan_list[:3]))
-    plans["health"] = " ".join(health_msgs) if health_msgs else agent_result.get("health", {}).get("message", "")
-
-    # ----- FINANCE -----
-    fin_snap = snapshot.get("finance", {})
-    income = fin_snap.get("monthly_income", 0)
-    expenses = fin_snap.get("monthly_expenses", 0)
-    subs = fin_snap.get("subscriptions", [])
-    fin_plan_list = agent_result.get("finance", {}).get("plan", [])
-    fin_msgs = []
-    if income and expenses:
-        balance = income - expenses
-        fin_msgs.append(f"Monthly balance: ₹{balance} ({'surplus' if balance>=0 else 'deficit'}).")
-    if subs:
-        fin_msgs.append(f"Subscriptions: {', '.join(subs)} — consider reviewing them.")
-    if fin_plan_list:
-        fin_msgs.append("Actions: " + " • ".join(fin_plan_list[:2]))
-    plans["finance"] = " ".join(fin_msgs) if fin_msgs else agent_result.get("finance", {}).get("message", "")
-
-    # ----- LEARNING -----
-    learn_snap = snapshot.get("learning", {})
-    study = learn_snap.get("study_minutes_daily", 0)
-    skill = learn_snap.get("current_skill", "")
-    learn_plan_list = agent_result.get("learning", {}).get("plan", [])
-    learn_msgs = []
-    if skill:
-        learn_msgs.append(f"Skill: {skill}.")
-    if study:
-        learn_msgs.append(f"Study time: {study} min/day — try short focused sessions.")
-    if learn_plan_list:
-        learn_msgs.append("Actions: " + " • ".join(learn_plan_list[:2]))
-    else:
-        learn_msgs.append(agent_result.get("learning", {}).get("message", "Keep a consistent learning habit."))
-    plans["learning"] = " ".join(learn_msgs)
-
-    # ----- PRODUCTIVITY -----
-    prod_snap = snapshot.get("productivity", {})
-    tasks = prod_snap.get("tasks", [])
-    completed = prod_snap.get("completed_today", 0)
-    prod_plan = agent_result.get("productivity", {})
-    prod_msgs = []
-    if tasks:
-        prod_msgs.append(f"You listed {len(tasks)} tasks; {completed} completed today.")
-    if prod_plan.get("scheduled"):
-        ev = prod_plan["scheduled"].get("event", {})
-        prod_msgs.append(f"Scheduled: {ev.get('title','task')} at {ev.get('start','TBD')} ({ev.get('duration','TBD')} mins).")
-    else:
-        prod_msgs.append(prod_plan.get("message", "No tasks scheduled."))
-    plans["productivity"] = " ".join(prod_msgs)
+@st.cache_resource
+def get_agent() -> 'Agent':
+    # imported on first use: the page renders before the agent stack loads
+    from src.agent import Agent
+    from src.memory import Memory
+    return Agent(Memory())
 
-    return plans
 
+@st.cache_resource
+def user_locks() -> Dict[str, threading.Lock]:
+    """One lock per user: sessions run on separate threads but share the agent."""
+    return {}
 
-# -----------------------------
-# ENHANCED CHAT RESPONSE (CONTEXT-AWARE)
-# -----------------------------
-def generate_chat_response(message: str, snapshot: Dict[str, Any], agent_result: Dict[str, Any]) -> str:
-    """
-    Context-aware chat replies: uses the user's snapshot and agent result to form specific advice.
-    Falls back to concise domain-driven guidance if message is generic.
-    """
-    msg = message.lower().strip()
-
-    # CAREER / JOB
-    if any(k in msg for k in ["job", "career", "interview", "resume", "dream job", "apply"]):
-        reply = [
-            "To get your target job: 1) Define the exact role and 2) tailor your resume to the JD (keywords & projects).",
-            "Build one relevant project and put it on GitHub/portfolio that demonstrates required skills.",
-            "Practice interview problems and behavioral stories. Apply consistently (3–5 roles/day).",
-            "If you share your target role, I can suggest a 30-day plan (projects, skills, interview prep)."
-        ]
-        return random.choice(reply)
-
-    # HEALTH QUESTIONS
-    if any(k in msg for k in ["health", "sleep", "steps", "exercise", "fitness", "diet", "tired", "weight"]):
-        health = snapshot.get("health", {})
-        steps = health.get("steps_per_day", 0)
-        sleep = health.get("sleep_hours", 0)
-        suggestions = []
-        if steps and steps < 5000:
-            suggestions.append(f"Walk at least 20–30 minutes daily — you currently do {steps} steps.")
-        if sleep and sleep < 7:
-            suggestions.append(f"Improve sleep routine; aim for 7–8 hours (you average {sleep}h).")
-        suggestions.append("Try short breathing or mindfulness (3–5 minutes) when stressed.")
-        return " ".join(suggestions)
-
-    # FINANCE QUESTIONS
-    if any(k in msg for k in ["finance", "money", "salary", "expenses", "budget", "savings"]):
-        fin = snapshot.get("finance", {})
-        income = fin.get("monthly_income", 0)
-        expenses = fin.get("monthly_expenses", 0)
-        subs = fin.get("subscriptions", [])
-        advice = []
-        if income and expenses:
-            bal = income - expenses
-            advice.append(f"Your monthly balance is ₹{bal}.")
-            if bal < 0:
-                advice.append("You are spending more than you earn — prioritize reducing expenses or increasing income.")
-        if subs:
-            advice.append(f"Review subscriptions: {', '.join(subs)} — cancel ones you don't use.")
-        advice.append("Track all expenses for 30 days to find quick savings.")
-        return " ".join(advice)
-
-    # LEARNING QUESTIONS
-    if any(k in msg for k in ["learn", "study", "skill", "practice", "course"]):
-        learning = snapshot.get("learning", {})
-        study = learning.get("study_minutes_daily", 0)
-        advice = []
-        if study and study < 20:
-            advice.append(f"You study {study} min/day — try 15–25 focused minutes using active recall.")
-        advice.append("Use spaced repetition and build a 30-day mini-project aligned to your goal.")
-        return " ".join(advice)
-
-    # PRODUCTIVITY QUESTIONS
-    if any(k in msg for k in ["task", "productivity", "focus", "routine", "todo"]):
-        prod = snapshot.get("productivity", {})
-        tasks = prod.get("tasks", [])
-        completed = prod.get("completed_today", 0)
-        advice = []
-        advice.append(f"You have {len(tasks)} tasks; completed {completed} today.")
-        advice.append("Try the Pomodoro technique (25min focus + 5min break) and pick 3 MITs daily.")
-        return " ".join(advice)
-
-    # GENERAL / DEFAULT
-    return (
-        "Good question — can you be a bit more specific? "
-        "Tell me which area you want to improve (health, finance, learning, productivity, career)."
-    )
+
+_USER_LOCKS_GUARD = threading.Lock()
+
+
+def user_lock(user_id: str) -> threading.Lock:
+    locks = user_locks()
+    with _USER_LOCKS_GUARD:
+        return locks.setdefault(user_id, threading.Lock())
+
+
+@st.cache_resource
+def history_revisions() -> Dict[str, int]:
+    """Per-user write counter; bumping it invalidates that user's cached history."""
+    return {}
+
+
+def snapshot_hash(snapshot: Dict, result=None) -> str:
+    """Hash of the snapshot and (plain) agent result: calendar slots and task bookings vary per run."""
+    text = json.dumps([snapshot, to_plain(result)], sort_keys=True, default=str)
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+@st.cache_data(max_entries=1000)
+def personalized_plans(key: str, _snapshot: Dict, _result) -> Dict[str, str]:
+    """generate_personalized_plans memoized on ``key`` (snapshot_hash of both inputs)."""
+    return generate_personalized_plans(_snapshot, _result)
+
+
+@st.cache_data(max_entries=1000)
+def recent_history(user_id: str, revision: int, limit: int = 5) -> List[Dict]:
+    return get_agent().memory.get_recent(user_id, 'daily_summary', limit)
 
 
 # -----------------------------
 # STREAMLIT UI
 # -----------------------------
-memory = Memory()
 st.set_page_config(layout="wide", page_title="AI Life Coach")
 st.markdown("""
 <style>
@@ -268,12 +165,18 @@ with right_col:
             }
         }
 
-        # run agent logic (keeps your agent unchanged)
-        agent = Agent(Memory())
-        result = agent.run(snapshot)
+        # run agent logic (keeps your agent unchanged); runs for the same user
+        # are serialized, as WorkflowRunner does by grouping snapshots per user
+        with user_lock(user_id):
+            result = get_agent().run(snapshot)
+        revisions = history_revisions()
+        revisions[user_id] = revisions.get(user_id, 0) + 1
 
         # generate personalized plan text from snapshot + agent result
-        personal_plans = generate_personalized_plans(snapshot, result)
+        personal_plans = personalized_plans(snapshot_hash(snapshot, result), snapshot, result)
+
+        # replies cached for the previous snapshot are stale now
+        REPLY_CACHE.invalidate(st.session_state["last_snapshot"])
 
         # save to session for chat usage
         st.session_state["last_snapshot"] = snapshot
@@ -305,6 +208,18 @@ with right_col:
         card("📘 Learning", plans_to_render.get("learning", "—"), "#E3F2FD")
         card("📅 Productivity", plans_to_render.get("productivity", "—"), "#F3E5F5")
 
+    last = st.session_state.get("last_snapshot")
+    if last:
+        history_user = last.get("user_id", "anonymous")
+        with st.expander("🕘 Recent check-ins"):
+            for event in recent_history(history_user, history_revisions().get(history_user, 0)):
+                entry = event["payload"]
+                st.markdown(
+                    f"- Health risk: **{entry.get('health', {}).get('risk', '—')}** · "
+                    f"Expenses: ₹{entry.get('finance', {}).get('total', '—')} · "
+                    f"{entry.get('productivity', {}).get('message', '')}"
+                )
+
 # -----------------------------
 # BOTTOM: Chat Section (Full Width)
 # -----------------------------
@@ -324,7 +239,7 @@ if st.button("Send"):
         res = st.session_state.get("last_result", {})
 
         # generate context-aware reply
-        reply = generate_chat_response(chat_prompt, snap, res)
+        reply = REPLY_CACHE.reply(chat_prompt, snap, res)
         st.session_state["chat_history"].append(("Coach", reply))
 
 # show chat history
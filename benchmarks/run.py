@@ -0,0 +1,341 @@
+# benchmarks/run.py (run from the project root)
+"""
+Hot-path benchmarks for Agent, Memory, WorkflowRunner and the coach helpers.
+
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --sizes 1000,100000 --compare bench.json
+    python -m benchmarks.run --only startup --startup-budget 0.15
+
+Results are written as JSON: ``{"meta": {...}, "results": {name: {"value",
+"unit", "better"}}}``. With ``--compare`` every metric present in both runs
+is checked against the baseline and the process exits 1 if any got worse by
+more than ``--tolerance``. With ``--startup-budget`` the process also
+exits 1 if importing the CLI stack takes longer than that many seconds or
+pulls in a module from ``LAZY_MODULES``.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+from src.agent import Agent
+from src.coach import classify_intents, generate_chat_response, generate_personalized_plans
+from src.memory import Memory
+from src.serialization import AVAILABLE
+from src.sqlite_memory import SqliteMemory
+from src.workflow import WorkflowRunner
+
+MEMORY_BACKENDS = {
+    'json': lambda d: Memory(os.path.join(d, 'store.json')),
+    'sqlite': lambda d: SqliteMemory(os.path.join(d, 'store.db')),
+}
+
+# what `python main.py` imports before doing any work
+STARTUP_IMPORTS = ('main', 'src.workflow')
+# heavy or optional modules that must only load in the code paths using them
+LAZY_MODULES = ('numpy', 'pandas', 'matplotlib', 'asyncio', 'concurrent.futures.process',
+                'orjson', 'msgpack', 'sqlite3', 'smtplib', 'streamlit')
+
+CHAT_MESSAGES = [
+    "how do I get my dream job?",
+    "I sleep badly and feel tired",
+    "help me with my budget",
+    "what should I study next",
+    "my todo list is too long",
+    "hello there",
+]
+
+
+# ------------------------------------------------------------
+# SYNTHETIC DATA
+# ------------------------------------------------------------
+def make_snapshot(rng: random.Random, i: int) -> Dict:
+    """A user snapshot carrying both the agent's and the app's field names."""
+    return {
+        "user_id": f"user{i:07d}",
+        "meta": {"name": f"User {i}", "email": f"user{i}@example.com"},
+        "health": {
+            "steps_last_7_days": rng.randint(0, 12000),
+            "sleep_hours_avg": round(rng.uniform(4, 9), 1),
+            "steps_per_day": rng.randint(0, 12000),
+            "sleep_hours": round(rng.uniform(4, 9), 1),
+            "stress_level": rng.choice(["low", "medium", "high"]),
+        },
+        "finance": {
+            "monthly_income": rng.randint(20000, 90000),
+            "monthly_expenses": rng.randint(10000, 60000),
+            "subscriptions": rng.sample(["Netflix", "Spotify", "Prime", "Gym"], 2),
+        },
+        "learning": {
+            "quiz_scores": [rng.randint(0, 100) for _ in range(rng.randint(0, 5))],
+            "last_active_days": rng.randint(0, 14),
+            "current_skill": "Data Science",
+            "study_minutes_daily": rng.randint(0, 60),
+        },
+        "productivity": {
+            "tasks": [f"task {j}" for j in range(rng.randint(0, 4))],
+            "completed_today": rng.randint(0, 3),
+        },
+    }
+
+
+def make_snapshots(n: int, seed: int = 0) -> List[Dict]:
+    rng = random.Random(seed)
+    return [make_snapshot(rng, i) for i in range(n)]
+
+
+def prefill(memory, events: int, users: int = 1000, batch: int = 100000):
+    """Write ``events`` synthetic events spread over ``users`` users."""
+    rng = random.Random(events)
+    written = 0
+    while written < events:
+        with memory.transaction():
+            for i in range(written, min(events, written + batch)):
+                memory.save_event(f"user{i % users:07d}", rng.choice(["health", "learning"]), {
+                    "domain": "health",
+                    "risk": rng.choice(["low", "medium", "high"]),
+                    "plan": ["Walk 20 minutes daily", "Keep regular bedtime"],
+                    "variant": i % 500,
+                })
+        written = min(events, written + batch)
+
+
+# ------------------------------------------------------------
+# MEASUREMENT
+# ------------------------------------------------------------
+def per_op(fn: Callable, ops: int) -> float:
+    """Mean seconds per call of ``fn`` over ``ops`` calls."""
+    start = time.perf_counter()
+    for i in range(ops):
+        fn(i)
+    return (time.perf_counter() - start) / ops
+
+
+def bench_agent(results: Dict, users: int):
+    snapshots = make_snapshots(users, seed=1)
+    with tempfile.TemporaryDirectory() as d:
+        agent = Agent(Memory(os.path.join(d, 'store.json')))
+        results["agent.run"] = {
+            "value": per_op(lambda i: agent.run(snapshots[i]), users),
+            "unit": "s/op", "better": "lower",
+        }
+
+
+def bench_memory(results: Dict, sizes: List[int], ops: int):
+    for backend, factory in MEMORY_BACKENDS.items():
+        for size in sizes:
+            with tempfile.TemporaryDirectory() as d:
+                memory = factory(d)
+                prefill(memory, size)
+                name = f"memory.{backend}.{size}"
+                start = time.perf_counter()
+                memory = factory(d)
+                memory.get_recent("user0000000", "health", 1)  # Memory opens lazily
+                results[f"{name}.open"] = {
+                    "value": time.perf_counter() - start, "unit": "s", "better": "lower",
+                }
+                payload = {"domain": "health", "risk": "low", "plan": ["Maintain current routine"]}
+                results[f"{name}.save_event"] = {
+                    "value": per_op(lambda i: memory.save_event(f"user{i % 1000:07d}", "health", payload), ops),
+                    "unit": "s/op", "better": "lower",
+                }
+                results[f"{name}.get_recent"] = {
+                    "value": per_op(lambda i: memory.get_recent(f"user{i % 1000:07d}", "health", 10), ops),
+                    "unit": "s/op", "better": "lower",
+                }
+
+
+def bench_codecs(results: Dict, events: int):
+    """Checkpoint write (compact) and store load time per installed codec."""
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'store.json')
+        prefill(Memory(path, checkpoint_every=0), events)
+        for codec in (name for name, ok in AVAILABLE.items() if ok):
+            memory = Memory(path, codec=codec)
+            memory.get_recent("user0000000", "health", 1)  # load before timing the write
+            start = time.perf_counter()
+            memory.compact()
+            name = f"memory.codec.{codec}.{events}"
+            results[f"{name}.save"] = {
+                "value": time.perf_counter() - start, "unit": "s", "better": "lower",
+            }
+            start = time.perf_counter()
+            Memory(path, codec=codec).get_recent("user0000000", "health", 1)
+            results[f"{name}.load"] = {
+                "value": time.perf_counter() - start, "unit": "s", "better": "lower",
+            }
+            results[f"{name}.bytes"] = {
+                "value": os.path.getsize(path), "unit": "B", "better": "lower",
+            }
+
+
+def import_time(module: str) -> float:
+    """Cumulative import time of ``module`` in a fresh interpreter (``-X importtime``)."""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                          capture_output=True, text=True, check=True)
+    for line in reversed(proc.stderr.splitlines()):
+        fields = [f.strip() for f in line.split('|')]
+        if len(fields) == 3 and fields[2] == module:
+            return int(fields[1]) / 1e6
+    raise RuntimeError(f"no import time reported for {module}")
+
+
+def bench_startup(results: Dict, runs: int = 5) -> List[str]:
+    """Import time of the CLI stack (median of ``runs``); returns lazy modules it loaded."""
+    code = f"import sys, {', '.join(STARTUP_IMPORTS)}; print(' '.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    loaded = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                            check=True).stdout.split()
+    for module in STARTUP_IMPORTS:
+        results[f"startup.import.{module}"] = {
+            "value": statistics.median(import_time(module) for _ in range(runs)),
+            "unit": "s", "better": "lower",
+        }
+    results["startup.lazy_modules_loaded"] = {"value": len(loaded), "unit": "modules", "better": "lower"}
+    return loaded
+
+
+def check_startup(results: Dict, loaded: List[str], budget: float) -> bool:
+    ok = True
+    for module in STARTUP_IMPORTS:
+        took = results[f"startup.import.{module}"]["value"]
+        if took > budget:
+            print(f"OVER BUDGET  import {module}: {took:.3f}s > {budget:.3f}s")
+            ok = False
+    if loaded:
+        print(f"OVER BUDGET  startup imported {', '.join(loaded)}")
+        ok = False
+    return ok
+
+
+def bench_workflow(results: Dict, sizes: List[int], workers: int):
+    """Sequential run_batch throughput, and with ``workers`` processes when > 1."""
+    modes = {"": {}}
+    if workers > 1:
+        modes[f"process{workers}."] = {"workers": workers, "executor": "process"}
+    for size in sizes:
+        snapshots = make_snapshots(size, seed=2)
+        for mode, options in modes.items():
+            with tempfile.TemporaryDirectory() as d:
+                runner = WorkflowRunner(Memory(os.path.join(d, 'store.json')))
+                start = time.perf_counter()
+                runner.run_batch(snapshots, **options)
+                elapsed = time.perf_counter() - start
+            results[f"workflow.run_batch.{mode}{size}"] = {
+                "value": size / elapsed, "unit": "users/s", "better": "higher",
+            }
+
+
+def bench_coach(results: Dict, ops: int):
+    snapshots = make_snapshots(100, seed=3)
+    with tempfile.TemporaryDirectory() as d:
+        agent = Agent(Memory(os.path.join(d, 'store.json')))
+        agent_results = [agent.run(s) for s in snapshots]
+    results["coach.generate_personalized_plans"] = {
+        "value": per_op(lambda i: generate_personalized_plans(snapshots[i % 100], agent_results[i % 100]), ops),
+        "unit": "s/op", "better": "lower",
+    }
+    results["coach.generate_chat_response"] = {
+        "value": per_op(lambda i: generate_chat_response(
+            CHAT_MESSAGES[i % len(CHAT_MESSAGES)], snapshots[i % 100], agent_results[i % 100]), ops),
+        "unit": "s/op", "better": "lower",
+    }
+    messages = [CHAT_MESSAGES[i % len(CHAT_MESSAGES)] for i in range(ops)]
+    start = time.perf_counter()
+    classify_intents(messages)
+    results["coach.classify_intents"] = {
+        "value": (time.perf_counter() - start) / ops, "unit": "s/op", "better": "lower",
+    }
+
+
+# ------------------------------------------------------------
+# REGRESSION COMPARISON
+# ------------------------------------------------------------
+def compare(baseline: Dict, current: Dict, tolerance: float) -> List[str]:
+    """Print each metric against the baseline; return the ones beyond ``tolerance``."""
+    regressions = []
+    for name, new in current["results"].items():
+        old = baseline["results"].get(name)
+        if not old or not old["value"] or not new["value"]:
+            continue
+        if new["better"] == "lower":
+            worse = new["value"] / old["value"]
+        else:
+            worse = old["value"] / new["value"]
+        marker = "REGRESSION" if worse > 1 + tolerance else "ok"
+        print(f"{marker:>10}  {name}: {old['value']:.4g} -> {new['value']:.4g} {new['unit']} (x{worse:.2f})")
+        if worse > 1 + tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def parse_sizes(text: str) -> List[int]:
+    return [int(s) for s in text.split(',') if s]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,100000,1000000', help="Memory store sizes (events)")
+    parser.add_argument('--batch-sizes', default='1000,10000,100000', help="run_batch sizes (users)")
+    parser.add_argument('--agent-users', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="process workers for the parallel run_batch timing (1 = skip it)")
+    parser.add_argument('--codec-events', type=int, default=100000, help="store size for codec timings")
+    parser.add_argument('--ops', type=int, default=2000, help="calls per latency measurement")
+    parser.add_argument('--only', default='startup,agent,memory,codec,workflow,coach')
+    parser.add_argument('--output', help="write results JSON here (default: stdout)")
+    parser.add_argument('--compare', help="baseline results JSON to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--startup-budget', type=float, help="max seconds to import each of STARTUP_IMPORTS")
+    args = parser.parse_args(argv)
+
+    only = set(args.only.split(','))
+    results: Dict[str, Dict] = {}
+    loaded: List[str] = []
+    if 'startup' in only or args.startup_budget is not None:
+        loaded = bench_startup(results)
+    if 'agent' in only:
+        bench_agent(results, args.agent_users)
+    if 'memory' in only:
+        bench_memory(results, parse_sizes(args.sizes), args.ops)
+    if 'codec' in only:
+        bench_codecs(results, args.codec_events)
+    if 'workflow' in only:
+        bench_workflow(results, parse_sizes(args.batch_sizes), args.workers)
+    if 'coach' in only:
+        bench_coach(results, args.ops)
+
+    report = {
+        "meta": {
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    status = 0
+    if args.startup_budget is not None and not check_startup(results, loaded, args.startup_budget):
+        status = 1
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        if compare(baseline, report, args.tolerance):
+            status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
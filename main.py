@@ -1,7 +1,9 @@
 # main.py (project root)
+import argparse
 import json
 import os
-from src.workflow import WorkflowRunner
+import sys
+from src.metrics import REGISTRY
 
 DATA_PATH = os.path.join('data', 'sample_user_data.json')
 
@@ -15,18 +17,47 @@ def load_sample():
 
 def pretty_print(results: dict):
     import pprint
+    from src.results import to_plain
     pp = pprint.PrettyPrinter(indent=2)
-    pp.pprint(results)
+    pp.pprint(to_plain(results))
+
+def run_stream(source: str, dest: str):
+    """Stream snapshots from a JSONL file/stdin into a JSONL results file/stdout."""
+    from src.workflow import WorkflowRunner, iter_jsonl
+    runner = WorkflowRunner()
+    if dest == '-':
+        for _ in runner.run_stream(iter_jsonl(source), sink=sys.stdout):
+            pass
+        return
+    with open(dest, 'w') as sink:
+        for _ in runner.run_stream(iter_jsonl(source), sink=sink):
+            pass
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="AI Life OS — Minimal demo")
+    parser.add_argument('--input', help="JSONL file of user snapshots ('-' for stdin)")
+    parser.add_argument('--output', default='-', help="JSONL results file ('-' for stdout)")
+    parser.add_argument('--metrics', help="write Prometheus metrics for the run to this file")
+    args = parser.parse_args()
+    REGISTRY.enabled = bool(args.metrics)
+    if args.input:
+        run_stream(args.input, args.output)
+        if args.metrics:
+            REGISTRY.write(args.metrics)
+        sys.exit(0)
+
     print("AI Life OS — Minimal demo")
+    from src.workflow import WorkflowRunner
     runner = WorkflowRunner()
     sample = load_sample()
     print("Running agent for sample user:", sample.get('user_id'))
     res = runner.run_once(sample)
     pretty_print(res)
     # show memory store content
-    from src.memory import Memory
-    mem = Memory()
+    from src.memory import MEMORY_FILE
+    from src.memory_index import MemoryReader
+    mem = MemoryReader(MEMORY_FILE)
     print("\nMemory summary for user:")
     print(json.dumps(mem.get_all(sample.get('user_id')), indent=2))
+    if args.metrics:
+        REGISTRY.write(args.metrics)
@@ -1,7 +1,63 @@
 # src/agent.py
-from typing import Dict
+import hashlib
+import inspect
+import json
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
 from src.memory import Memory
-from src.tools import EmailTool, CalendarTool, summarize_plan
+from src.metrics import REGISTRY, MetricsRegistry
+from src.results import (Risk, HealthResult, FinanceResult, LearningResult,
+                         ProductivityResult)
+from src.tasks import DEFAULT_DURATION_MIN, TaskQueue
+from src.tools import EmailTool, CalendarTool, AsyncEmailTool, AsyncCalendarTool, parse_start
+
+if TYPE_CHECKING:  # numpy and asyncio are imported where they're used (startup time)
+    import numpy as np
+
+# Risk tiers in plan-id order: run_many computes the index, run the tier.
+RISK_TIERS = (Risk.LOW, Risk.MEDIUM, Risk.HIGH)
+
+# Plans are shared tuples: every result of a tier references the same one.
+HEALTH_PLANS = {
+    Risk.HIGH: (
+        'Walk 20 minutes daily',
+        'Follow a sleep-winddown routine',
+        'Track sleep for 2 weeks'
+    ),
+    Risk.MEDIUM: ('Increase steps by 20%', 'Keep regular bedtime'),
+    Risk.LOW: ('Maintain current routine',),
+}
+
+LEARNING_PLANS = {
+    Risk.HIGH: ('Daily 15-min micro-lesson', 'Practice quiz every 3 days'),
+    Risk.MEDIUM: ('3 micro-lessons per week', 'Weekly practice quiz'),
+    Risk.LOW: ('Keep current pace',),
+}
+
+FINANCE_PLAN = ("No urgent action", "Review subscriptions monthly")
+FINANCE_ALERT_TOTAL = 40000
+
+DOMAINS = ('health', 'finance', 'learning', 'productivity')
+
+
+def input_fingerprint(domain_input) -> bytes:
+    """Digest of one snapshot sub-dict; equal inputs give equal digests."""
+    text = json.dumps(domain_input, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+
+def expense_total(finance_data: Dict):
+    expenses = finance_data.get('monthly_expenses', 0)
+
+    # FIX: allow integer monthly_expenses
+    if isinstance(expenses, (int, float)):
+        expenses = [expenses]
+
+    return sum(expenses) if expenses else 0
+
 
 class Agent:
     """
@@ -11,186 +67,507 @@ class Agent:
     - learning coach
     - productivity scheduling
     Saves interventions to Memory and uses stub tools for actions.
+    Policy latencies and outcome counts go to ``metrics`` when it is enabled.
+
+    With ``incremental`` (the default) the agent remembers, per user and
+    domain, a fingerprint of the last input and the result it produced.
+    Domains whose input is unchanged reuse that result and are not persisted
+    again; ``daily_summary`` (and the alert email) is only written when at
+    least one domain changed. This state (and the cached task queues) is
+    kept for the ``max_users`` most recently seen users; older ones are
+    simply evaluated afresh.
+
+    ``email`` is anything with EmailTool's ``send``; pass an
+    ``src.outbox.Outbox`` to take email delivery off the run's latency path.
+
+    Each user's tasks live in a TaskQueue, saved to memory (key
+    ``task_queue``) whenever it changes so later runs and other processes
+    continue from it. Up to ``top_k`` of the most urgent tasks not scheduled
+    yet are booked per calendar day; the productivity result lists all of
+    the day's bookings. A new day counts as a productivity input change.
     """
-    def __init__(self, memory: Memory):
+    def __init__(self, memory: Memory, metrics: MetricsRegistry = None, incremental: bool = True,
+                 email: EmailTool = None, top_k: int = 3, max_users: int = 100_000):
         self.memory = memory
-        self.email = EmailTool()
+        self.email = email if email is not None else EmailTool()
         self.calendar = CalendarTool()
+        self.metrics = metrics if metrics is not None else REGISTRY
+        self.incremental = incremental
+        self.top_k = top_k
+        self.max_users = max_users
+        # both LRU-ordered and bounded by max_users; queues reload from memory
+        self._task_queues: 'OrderedDict[str, TaskQueue]' = OrderedDict()
+        # user_id -> domain -> (input fingerprint, result)
+        self._last: 'OrderedDict[str, Dict[str, Tuple[Optional[bytes], object]]]' = OrderedDict()
 
     # ------------------------------------------------------------
     # HEALTH POLICY
     # ------------------------------------------------------------
-    def health_policy(self, user_id: str, snapshot: Dict) -> Dict:
+    def health_policy(self, user_id: str, snapshot: Dict) -> HealthResult:
         steps = snapshot.get('steps_last_7_days', 0)
         sleep = snapshot.get('sleep_hours_avg', 7)
 
-        plan = []
-        risk = 'low'
+        risk = Risk.LOW
 
         if steps < 2000 or sleep < 5.5:
-            risk = 'high'
-            plan = [
-                'Walk 20 minutes daily',
-                'Follow a sleep-winddown routine',
-                'Track sleep for 2 weeks'
-            ]
+            risk = Risk.HIGH
         elif steps < 5000 or sleep < 6.5:
-            risk = 'medium'
-            plan = ['Increase steps by 20%', 'Keep regular bedtime']
-        else:
-            plan = ['Maintain current routine']
+            risk = Risk.MEDIUM
 
-        return {
-            "domain": "health",
-            "risk": risk,
-            "plan": plan,
-            "message": f"Health plan: {summarize_plan(plan)}"
-        }
+        return HealthResult(risk, HEALTH_PLANS[risk])
 
     # ------------------------------------------------------------
     # FINANCE POLICY (FIXED)
     # ------------------------------------------------------------
-    def finance_policy(self, user_id, finance_data):
-        expenses = finance_data.get('monthly_expenses', 0)
-        subs = finance_data.get('subscriptions', [])
-
-        # FIX: allow integer monthly_expenses
-        if isinstance(expenses, (int, float)):
-            expenses = [expenses]
-
-        total = sum(expenses) if expenses else 0
+    def finance_policy(self, user_id, finance_data) -> FinanceResult:
+        total = expense_total(finance_data)
 
         alert = None
-        if total > 40000:
+        if total > FINANCE_ALERT_TOTAL:
             alert = "High spending detected"
 
-        plan = ["No urgent action", "Review subscriptions monthly"]
-
-        return {
-            "domain": "finance",
-            "total": total,
-            "alert": alert,
-            "plan": plan,
-            "message": f"Finance plan: {plan[0]} • {plan[1]}"
-        }
+        return FinanceResult(total, alert, FINANCE_PLAN)
 
     # ------------------------------------------------------------
     # LEARNING POLICY
     # ------------------------------------------------------------
-    def learning_policy(self, user_id: str, snapshot: Dict) -> Dict:
+    def learning_policy(self, user_id: str, snapshot: Dict) -> LearningResult:
         scores = snapshot.get('quiz_scores', [])
         avg = sum(scores) / len(scores) if scores else 0
         last_active = snapshot.get('last_active_days', 999)
 
-        risk = 'low'
-        plan = []
+        risk = Risk.LOW
 
         if avg < 40 or last_active > 7:
-            risk = 'high'
-            plan = ['Daily 15-min micro-lesson', 'Practice quiz every 3 days']
+            risk = Risk.HIGH
         elif avg < 60 or last_active > 3:
-            risk = 'medium'
-            plan = ['3 micro-lessons per week', 'Weekly practice quiz']
-        else:
-            plan = ['Keep current pace']
+            risk = Risk.MEDIUM
 
-        return {
-            "domain": "learning",
-            "risk": risk,
-            "plan": plan,
-            "message": f"Learning plan: {summarize_plan(plan)}"
-        }
+        return LearningResult(risk, LEARNING_PLANS[risk])
 
     # ------------------------------------------------------------
     # PRODUCTIVITY POLICY (FULLY FIXED)
     # ------------------------------------------------------------
-    def productivity_policy(self, user_id: str, snapshot: Dict) -> Dict:
-        tasks = snapshot.get('tasks', [])
-
-        # FIX: Convert string tasks → dict tasks
-        normalized_tasks = []
-        for t in tasks:
-            if isinstance(t, str):
-                normalized_tasks.append({
-                    "title": t,
-                    "priority": 5,
-                    "start_time": "TBD"
-                })
-            else:
-                normalized_tasks.append(t)
-
-        tasks = normalized_tasks
-
-        if not tasks:
-            return {
-                "domain": "productivity",
-                "scheduled": None,
-                "message": "No tasks to schedule"
-            }
-
-        # choose highest-priority
-        top = sorted(tasks, key=lambda t: t.get('priority', 5))[0]
-
-        ev = self.calendar.create_event(
-            user_id,
-            top.get('title', 'Task'),
-            top.get('start_time', 'TBD')
-        )
-
-        return {
-            "domain": "productivity",
-            "scheduled": ev,
-            "message": f"Scheduled: {top.get('title')}"
-        }
+    def productivity_policy(self, user_id: str, snapshot: Dict) -> ProductivityResult:
+        queue = self._task_queue(user_id, snapshot)
+        tasks = queue.pop(self.top_k - len(queue.booked))
+        for task in tasks:
+            # earliest free slot at/after the task's own start time (or now)
+            queue.book(task, self.calendar.schedule(user_id, *self._slot_request(task)))
+        return self._booked(user_id, queue, len(tasks))
+
+    def _today(self) -> str:
+        return self.calendar.clock().date().isoformat()
+
+    def _task_queue(self, user_id: str, snapshot: Dict) -> TaskQueue:
+        """The user's queue, synced with today's task list."""
+        queue = self._load_queue(user_id)
+        queue.start_day(self._today())
+        queue.sync(snapshot.get('tasks', []))
+        return queue
+
+    def _load_queue(self, user_id: str) -> TaskQueue:
+        """The user's cached queue, else the one saved in memory (its bookings for today go back on the calendar)."""
+        queue = self._task_queues.get(user_id)
+        if queue is not None:
+            self._task_queues.move_to_end(user_id)
+            return queue
+        saved = self.memory.get_recent(user_id, 'task_queue', 1)
+        queue = TaskQueue.from_state(saved[0]['payload']) if saved else TaskQueue()
+        if queue.day == self._today():
+            # booked by another process or before a restart; slots already busy were loaded before
+            events = [res["event"] for _, res in queue.booked]
+            self.calendar.add_events([ev for ev in events if not self._on_calendar(ev)])
+        self._task_queues[user_id] = queue
+        self._evict_queues()
+        return queue
+
+    def _on_calendar(self, event: Dict) -> bool:
+        start = parse_start(event.get("start"))
+        return start is not None and not self.calendar.is_free(event["user"], start, event.get("duration") or 0)
+
+    def _booked(self, user_id: str, queue: TaskQueue, created: int) -> ProductivityResult:
+        """Persist the queue if it changed and report the day's bookings."""
+        if queue.dirty:
+            self.memory.save_event(user_id, 'task_queue', queue.state())
+            queue.dirty = False
+            self.memory.on_rollback(partial(setattr, queue, 'dirty', True))
+        if created and self.metrics.enabled:
+            self.metrics.counter('agent_calendar_events_total', 'Calendar events created.').inc(created)
+        return self._productivity_result(queue.booked)
+
+    @staticmethod
+    def _slot_request(task: Dict):
+        return (task.get('title', 'Task'), task.get('duration_min', DEFAULT_DURATION_MIN),
+                parse_start(task.get('start_time')))
+
+    @staticmethod
+    def _productivity_result(booked: List[Tuple[Dict, Dict]]) -> ProductivityResult:
+        if not booked:
+            return ProductivityResult(None)
+        (task, event), rest = booked[0], booked[1:]
+        return ProductivityResult(event, task.get('title'), tuple(e for _, e in rest))
+
+    # ------------------------------------------------------------
+    # VECTORIZED POLICIES (same thresholds as the scalar ones above)
+    # ------------------------------------------------------------
+    @staticmethod
+    def _tier_results(result_cls, tiers: 'np.ndarray', plans: Dict) -> List:
+        return [result_cls(RISK_TIERS[t], plans[RISK_TIERS[t]]) for t in tiers.tolist()]
+
+    def health_policy_batch(self, snapshots: List[Dict]) -> List[HealthResult]:
+        import numpy as np
+        steps = np.array([s.get('steps_last_7_days', 0) for s in snapshots], dtype=float)
+        sleep = np.array([s.get('sleep_hours_avg', 7) for s in snapshots], dtype=float)
+        high = (steps < 2000) | (sleep < 5.5)
+        medium = (steps < 5000) | (sleep < 6.5)
+        tiers = np.select([high, medium], [2, 1], 0)
+        return self._tier_results(HealthResult, tiers, HEALTH_PLANS)
+
+    def learning_policy_batch(self, snapshots: List[Dict]) -> List[LearningResult]:
+        import numpy as np
+        # averaged with Python's sum so tiers match the scalar path bit-for-bit
+        avg = np.array([
+            sum(sc) / len(sc) if sc else 0
+            for sc in (s.get('quiz_scores', []) for s in snapshots)
+        ], dtype=float)
+        last_active = np.array([s.get('last_active_days', 999) for s in snapshots], dtype=float)
+        high = (avg < 40) | (last_active > 7)
+        medium = (avg < 60) | (last_active > 3)
+        tiers = np.select([high, medium], [2, 1], 0)
+        return self._tier_results(LearningResult, tiers, LEARNING_PLANS)
+
+    def finance_policy_batch(self, snapshots: List[Dict]) -> List[FinanceResult]:
+        import numpy as np
+        totals = [expense_total(s) for s in snapshots]
+        alerts = (np.array(totals, dtype=float) > FINANCE_ALERT_TOTAL).tolist()
+        return [FinanceResult(total, "High spending detected" if alert else None, FINANCE_PLAN)
+                for total, alert in zip(totals, alerts)]
 
     # ------------------------------------------------------------
     # MAIN ORCHESTRATOR
     # ------------------------------------------------------------
     def run(self, user_snapshot: Dict) -> Dict:
         user_id = user_snapshot.get('user_id', 'anonymous')
-        meta = user_snapshot.get('meta', {})
-        responses = {}
+        stale = self._stale(user_id, user_snapshot)
+        # all events of one run are written in a single flush
+        with self.memory.transaction():
+            h = self._evaluate_sync('health', self.health_policy, user_id, user_snapshot, stale)
+            f = self._evaluate_sync('finance', self.finance_policy, user_id, user_snapshot, stale)
+            l = self._evaluate_sync('learning', self.learning_policy, user_id, user_snapshot, stale)
+            return self._record(user_snapshot, h, f, l, stale)
+
+    def run_many(self, snapshots: List[Dict]) -> List[Dict]:
+        """
+        Batch version of run(): health, finance and learning are scored with
+        vectorized masks over all snapshots at once. Returns one result per
+        snapshot, in order, identical to calling run() on each.
+        """
+        h = self._timed_batch('health', self.health_policy_batch, snapshots)
+        f = self._timed_batch('finance', self.finance_policy_batch, snapshots)
+        l = self._timed_batch('learning', self.learning_policy_batch, snapshots)
+        with self.memory.transaction():
+            return [self._record(s, *self._reuse(s, hr, fr, lr))
+                    for s, hr, fr, lr in zip(snapshots, h, f, l)]
 
-        # Health
-        h = self.health_policy(user_id, user_snapshot.get('health', {}))
-        self.memory.save_event(user_id, 'health', h)
-        responses['health'] = h
+    # ------------------------------------------------------------
+    # INCREMENTAL RE-EVALUATION
+    # ------------------------------------------------------------
+    def _stale(self, user_id: str, user_snapshot: Dict) -> Dict[str, Optional[bytes]]:
+        """Domains whose input changed since the last run for ``user_id``, with their fingerprints."""
+        if not self.incremental:
+            return dict.fromkeys(DOMAINS)
+        last = self._last.get(user_id)
+        if last is None:
+            last = {}
+        else:
+            self._last.move_to_end(user_id)
+        stale = {}
+        for domain in DOMAINS:
+            domain_input = user_snapshot.get(domain, {})
+            if domain == 'productivity':
+                # bookings are per day: the same task list is new input tomorrow
+                domain_input = [domain_input, self._today()]
+            fp = input_fingerprint(domain_input)
+            prev = last.get(domain)
+            if prev is None or prev[0] != fp:
+                stale[domain] = fp
+        return stale
+
+    def _cached(self, user_id: str, domain: str):
+        return self._last[user_id][domain][1]
+
+    def _evaluate_sync(self, domain: str, policy, user_id: str, user_snapshot: Dict, stale: Dict):
+        if domain not in stale:
+            return self._cached(user_id, domain)
+        return self._timed(domain, policy, user_id, user_snapshot.get(domain, {}))
+
+    def _reuse(self, user_snapshot: Dict, h: HealthResult, f: FinanceResult, l: LearningResult):
+        """run_many: swap precomputed results for cached ones where the input is unchanged."""
+        user_id = user_snapshot.get('user_id', 'anonymous')
+        stale = self._stale(user_id, user_snapshot)
+        fresh = {'health': h, 'finance': f, 'learning': l}
+        h, f, l = (fresh[d] if d in stale else self._cached(user_id, d)
+                   for d in ('health', 'finance', 'learning'))
+        return h, f, l, stale
+
+    def _remember(self, user_id: str, stale: Dict, responses: Dict):
+        if not self.incremental or not stale:
+            return
+        last = self._last.get(user_id)
+        if last is None:
+            last = self._last[user_id] = {}
+            self._evict(self._last)
+        for domain, fp in stale.items():
+            last[domain] = (fp, responses[domain])
+        # if this run's events are never written, the next run redoes these domains
+        self.memory.on_rollback(partial(self._forget, user_id, list(stale)))
+
+    def _forget(self, user_id: str, domains: List[str]):
+        last = self._last.get(user_id)
+        if last is not None:
+            for domain in domains:
+                last.pop(domain, None)
+
+    def user_state(self, user_ids: Iterable[str]) -> Dict:
+        """
+        Per-user state of ``user_ids`` (incremental cache and task queue),
+        for ``load_user_state`` in another agent or process.
+        """
+        state = {}
+        for u in set(user_ids):
+            state[u] = {"last": self._last.get(u), "tasks": self._load_queue(u).state()}
+        return state
+
+    def load_user_state(self, state: Dict):
+        for user_id, user in state.items():
+            if user["last"] is not None:
+                self._last[user_id] = user["last"]
+                self._last.move_to_end(user_id)
+            if user["tasks"] is not None:
+                self._task_queues[user_id] = TaskQueue.from_state(user["tasks"])
+                self._task_queues.move_to_end(user_id)
+        self._evict(self._last)
+        self._evict_queues()
+
+    def _evict(self, users: OrderedDict) -> List[str]:
+        evicted = []
+        while len(users) > self.max_users:
+            evicted.append(users.popitem(last=False)[0])
+        return evicted
+
+    def _evict_queues(self):
+        for user_id in self._evict(self._task_queues):
+            if not self.calendar.keep_events:
+                # the busy index is all that holds their slots; reloading the queue restores it
+                self.calendar.forget(user_id)
 
-        # Finance
-        f = self.finance_policy(user_id, user_snapshot.get('finance', {}))
-        self.memory.save_event(user_id, 'finance', f)
-        responses['finance'] = f
+    # ------------------------------------------------------------
+    # METRICS
+    # ------------------------------------------------------------
+    def _timed(self, domain: str, policy, *args):
+        if not self.metrics.enabled:
+            return policy(*args)
+        start = time.perf_counter()
+        try:
+            return policy(*args)
+        finally:
+            self.metrics.histogram(
+                'agent_policy_seconds', 'Latency of one domain policy call.'
+            ).observe(time.perf_counter() - start, policy=domain)
+
+    def _timed_batch(self, domain: str, policy, snapshots: List[Dict]) -> List:
+        domain_snapshots = [s.get(domain, {}) for s in snapshots]
+        if not self.metrics.enabled:
+            return policy(domain_snapshots)
+        start = time.perf_counter()
+        try:
+            return policy(domain_snapshots)
+        finally:
+            self.metrics.histogram(
+                'agent_batch_policy_seconds', 'Latency of one vectorized policy call over a batch.'
+            ).observe(time.perf_counter() - start, policy=domain)
+
+    def _count(self, responses: Dict, emailed: bool, stale: Dict):
+        if not self.metrics.enabled:
+            return
+        risks = self.metrics.counter('agent_risk_total', 'Policy results by domain and risk tier.')
+        for domain in ('health', 'learning'):
+            if domain in stale:
+                risks.inc(domain=domain, risk=responses[domain].risk.value)
+        if 'finance' in stale and responses['finance'].alert:
+            self.metrics.counter('agent_finance_alerts_total', 'High-spending alerts raised.').inc()
+        reused = self.metrics.counter('agent_domains_reused_total',
+                                      'Domains skipped because their input was unchanged.')
+        for domain in DOMAINS:
+            if domain not in stale:
+                reused.inc(domain=domain)
+        if emailed:
+            self.metrics.counter('agent_emails_sent_total', 'High-risk emails sent.').inc()
+
+    def _record(self, user_snapshot: Dict, h: HealthResult, f: FinanceResult,
+                l: LearningResult, stale: Dict) -> Dict:
+        """Shared tail of run/run_many: productivity, alerts and persistence."""
+        user_id = user_snapshot.get('user_id', 'anonymous')
+        responses = {'health': h, 'finance': f, 'learning': l}
 
-        # Learning
-        l = self.learning_policy(user_id, user_snapshot.get('learning', {}))
-        self.memory.save_event(user_id, 'learning', l)
-        responses['learning'] = l
+        # Health, Finance, Learning (only the re-evaluated ones)
+        for domain in ('health', 'finance', 'learning'):
+            if domain in stale:
+                self.memory.save_event(user_id, domain, responses[domain])
 
         # Productivity
-        p = self.productivity_policy(user_id, user_snapshot.get('productivity', {}))
-        self.memory.save_event(user_id, 'productivity', p)
+        p = self._evaluate_sync('productivity', self.productivity_policy, user_id, user_snapshot, stale)
+        if 'productivity' in stale:
+            self.memory.save_event(user_id, 'productivity', p)
         responses['productivity'] = p
 
+        alert = self._alert(user_snapshot, responses, stale)
+        if alert:
+            email_to, subj, body = alert
+            self.email.send(email_to, subj, body)
+
+            self.memory.save_event(user_id, 'email_sent',
+                                   {"to": email_to, "subject": subj})
+
+        # Save combined summary
+        if stale:
+            self.memory.save_event(user_id, 'daily_summary', responses)
+        self._remember(user_id, stale, responses)
+        self._count(responses, alert is not None, stale)
+        return responses
+
+    @staticmethod
+    def _alert(user_snapshot: Dict, responses: Dict, stale: Dict):
+        """
+        (to, subject, body) of the high-risk email, or None if nothing is
+        critical or neither health nor learning was re-evaluated this run.
+        """
+        meta = user_snapshot.get('meta', {})
+
         # Send email only for high-risk
         critical = []
-        if h.get('risk') == 'high':
+        if responses['health'].risk is Risk.HIGH:
             critical.append('health')
-        if l.get('risk') == 'high':
+        if responses['learning'].risk is Risk.HIGH:
             critical.append('learning')
 
-        if critical:
-            subj = "AI Life OS — Recommended Actions"
-            body_lines = [
-                f"- {d.title()}: {responses[d]['message']}" for d in critical
-            ]
-            body = f"Hi {meta.get('name','User')},\n\nI detected issues in: {', '.join(critical)}.\n\nRecommendations:\n" + "\n".join(body_lines)
+        if not critical or not ('health' in stale or 'learning' in stale):
+            return None
+
+        subj = "AI Life OS — Recommended Actions"
+        body_lines = [
+            f"- {d.title()}: {responses[d].message}" for d in critical
+        ]
+        body = f"Hi {meta.get('name','User')},\n\nI detected issues in: {', '.join(critical)}.\n\nRecommendations:\n" + "\n".join(body_lines)
+
+        email_to = meta.get('email', 'user@example.com')
+        return email_to, subj, body
 
-            email_to = meta.get('email', 'user@example.com')
-            self.email.send(email_to, subj, body)
+
+class AsyncAgent(Agent):
+    """
+    asyncio variant of Agent. Tool calls are awaited, and within one run the
+    four domain policies (and the calendar call) are evaluated concurrently.
+    ``run_many`` drives many users on one event loop, at most
+    ``concurrency`` in flight at a time. Runs for the same user are
+    serialized, so repeated users behave like sequential ``run`` calls.
+    """
+    def __init__(self, memory: Memory, email: AsyncEmailTool = None,
+                 calendar: AsyncCalendarTool = None, metrics: MetricsRegistry = None,
+                 incremental: bool = True, top_k: int = 3, max_users: int = 100_000):
+        super().__init__(memory, metrics, incremental, top_k=top_k, max_users=max_users)
+        self.email = email if email is not None else AsyncEmailTool()
+        self.calendar = calendar if calendar is not None else AsyncCalendarTool()
+        # user_id -> [lock, holders + waiters]; dropped when nobody uses it
+        self._user_locks: Dict[str, list] = {}
+
+    @asynccontextmanager
+    async def _user_lock(self, user_id: str):
+        """Hold ``user_id``'s lock from the staleness check to _remember."""
+        import asyncio
+        entry = self._user_locks.get(user_id)
+        if entry is None:
+            entry = self._user_locks[user_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._user_locks[user_id]
+
+    async def _evaluate(self, domain: str, policy, user_id: str, user_snapshot: Dict, stale: Dict):
+        return self._evaluate_sync(domain, policy, user_id, user_snapshot, stale)
+
+    async def _productivity(self, user_id: str, user_snapshot: Dict, stale: Dict) -> ProductivityResult:
+        if 'productivity' not in stale:
+            return self._cached(user_id, 'productivity')
+        return await self.productivity_policy(user_id, user_snapshot.get('productivity', {}))
+
+    async def productivity_policy(self, user_id: str, snapshot: Dict) -> ProductivityResult:
+        queue = self._task_queue(user_id, snapshot)
+        tasks = queue.pop(self.top_k - len(queue.booked))
+        for task in tasks:
+            queue.book(task, await self.calendar.schedule(user_id, *self._slot_request(task)))
+        return self._booked(user_id, queue, len(tasks))
+
+    async def run(self, user_snapshot: Dict) -> Dict:
+        import asyncio
+        user_id = user_snapshot.get('user_id', 'anonymous')
+        async with self._user_lock(user_id):
+            stale = self._stale(user_id, user_snapshot)
+            # gathered tasks inherit the context, so the task queue saved by the
+            # productivity step lands in this run's transaction too
+            with self.memory.transaction():
+                h, f, l, p = await asyncio.gather(
+                    self._evaluate('health', self.health_policy, user_id, user_snapshot, stale),
+                    self._evaluate('finance', self.finance_policy, user_id, user_snapshot, stale),
+                    self._evaluate('learning', self.learning_policy, user_id, user_snapshot, stale),
+                    self._productivity(user_id, user_snapshot, stale)
+                )
+                return await self._record(user_snapshot, h, f, l, p, stale)
+
+    async def run_many(self, snapshots: List[Dict], concurrency: int = 100) -> List[Dict]:
+        """Vectorized scoring for all users, then tool I/O with bounded concurrency."""
+        import asyncio
+        h = self._timed_batch('health', self.health_policy_batch, snapshots)
+        f = self._timed_batch('finance', self.finance_policy_batch, snapshots)
+        l = self._timed_batch('learning', self.learning_policy_batch, snapshots)
+        sem = asyncio.Semaphore(concurrency)
+
+        async def one(snapshot, h, f, l):
+            user_id = snapshot.get('user_id', 'anonymous')
+            async with sem, self._user_lock(user_id):
+                h, f, l, stale = self._reuse(snapshot, h, f, l)
+                with self.memory.transaction():
+                    p = await self._productivity(user_id, snapshot, stale)
+                    return await self._record(snapshot, h, f, l, p, stale)
+
+        return list(await asyncio.gather(*(one(*args) for args in zip(snapshots, h, f, l))))
+
+    async def _record(self, user_snapshot: Dict, h: HealthResult, f: FinanceResult,
+                      l: LearningResult, p: ProductivityResult, stale: Dict) -> Dict:
+        """Async tail of run/run_many, called inside the run's transaction (per task, so concurrent runs don't mix)."""
+        user_id = user_snapshot.get('user_id', 'anonymous')
+        responses = {'health': h, 'finance': f, 'learning': l, 'productivity': p}
+        for domain, result in responses.items():
+            if domain in stale:
+                self.memory.save_event(user_id, domain, result)
+
+        alert = self._alert(user_snapshot, responses, stale)
+        if alert:
+            email_to, subj, body = alert
+            sent = self.email.send(email_to, subj, body)
+            if inspect.isawaitable(sent):  # an Outbox queues synchronously
+                await sent
 
             self.memory.save_event(user_id, 'email_sent',
                                    {"to": email_to, "subject": subj})
 
-        # Save combined summary
-        self.memory.save_event(user_id, 'daily_summary', responses)
+        if stale:
+            self.memory.save_event(user_id, 'daily_summary', responses)
+        self._remember(user_id, stale, responses)
+        self._count(responses, alert is not None, stale)
         return responses
@@ -0,0 +1,171 @@
+# src/analytics.py
+"""
+Columnar views over Memory history for cohort statistics.
+
+    frame = history_frame(memory)                 # one row per event
+    risk_distribution(frame, freq='W')            # tier counts per week/domain
+    expense_totals(frame)                         # finance totals per day
+    export_cache(frame, 'data/analytics_cache')   # .npy columns for dashboards
+    frame = load_cache('data/analytics_cache')    # memory-mapped reload
+
+Works with Memory, ShardedMemory (one chunk per shard) and SqliteMemory.
+"""
+import json
+import os
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from src.agent import expense_total
+
+HISTORY_KEYS = ('health', 'finance', 'learning')
+HISTORY_FIELDS = ('risk', 'total', 'alert')
+
+
+def _chunks(memory) -> List:
+    """One reader per user shard (ShardedMemory) or the memory itself."""
+    if hasattr(memory, 'existing_shards'):
+        return [memory.shard(i) for i in memory.existing_shards()]
+    return [memory]
+
+
+def _column(values) -> pd.Series:
+    series = pd.Series(values)
+    # strings (ids, tiers, alerts) are stored once per distinct value
+    if series.dtype == object or pd.api.types.is_string_dtype(series.dtype):
+        return series.astype('category')
+    return series
+
+
+def history_frame(memory, keys: Optional[Sequence[str]] = HISTORY_KEYS,
+                  fields: Sequence[str] = HISTORY_FIELDS) -> pd.DataFrame:
+    """
+    One row per event of ``keys`` (None = all keys) with columns user_id,
+    key, ts (datetime64) and only the payload ``fields`` asked for.
+    """
+    frames = []
+    for chunk in _chunks(memory):
+        cols: Dict[str, List] = {"user_id": [], "key": [], "ts": []}
+        cols.update((f, []) for f in fields)
+        projected = [cols[f] for f in fields]
+        for user_id, key, ts, payload in chunk.iter_events(keys):
+            cols["user_id"].append(user_id)
+            cols["key"].append(key)
+            cols["ts"].append(ts)
+            if isinstance(payload, dict):
+                for f, out in zip(fields, projected):
+                    out.append(payload.get(f))
+            else:
+                for out in projected:
+                    out.append(None)
+        frames.append(pd.DataFrame(cols))
+    frame = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(
+        {c: [] for c in ("user_id", "key", "ts", *fields)})
+    frame["ts"] = pd.to_datetime(frame["ts"].astype(float), unit='s')
+    for c in ("user_id", "key", *fields):
+        frame[c] = _column(frame[c])
+    return frame
+
+
+def risk_distribution(frame: pd.DataFrame, freq: str = 'D', key: Optional[str] = None) -> pd.DataFrame:
+    """Event counts per (period, key) with one column per risk tier."""
+    rows = frame[frame["risk"].notna()]
+    if key is not None:
+        rows = rows[rows["key"] == key]
+    period = rows["ts"].dt.floor(freq).rename("period")
+    return rows.groupby([period, "key", "risk"], observed=True).size().unstack("risk", fill_value=0)
+
+
+def expense_totals(frame: pd.DataFrame, freq: str = 'D') -> pd.DataFrame:
+    """Per period: users with a finance check, summed/mean expense total and alerts raised."""
+    rows = frame[frame["key"] == "finance"]
+    period = rows["ts"].dt.floor(freq).rename("period")
+    return rows.groupby(period).agg(
+        users=("user_id", "nunique"),
+        total_sum=("total", "sum"),
+        total_mean=("total", "mean"),
+        alerts=("alert", "count"),
+    )
+
+
+def latest(frame: pd.DataFrame, key: str) -> pd.DataFrame:
+    """Each user's most recent row for ``key``."""
+    rows = frame[frame["key"] == key].sort_values("ts", kind="stable")
+    return rows.drop_duplicates("user_id", keep="last").set_index("user_id")
+
+
+# ------------------------------------------------------------
+# SNAPSHOT INPUTS (fields the stored results don't carry)
+# ------------------------------------------------------------
+def snapshot_frame(snapshots: Iterable[Dict]) -> pd.DataFrame:
+    """
+    One row per user snapshot: steps, sleep, expense total, quiz average and
+    days since last activity. Quiz averages are computed in one pass over
+    the flattened scores (0 for users without any, like learning_policy).
+    """
+    snapshots = list(snapshots)
+    health = [s.get('health', {}) for s in snapshots]
+    learning = [s.get('learning', {}) for s in snapshots]
+    scores = [l.get('quiz_scores', []) for l in learning]
+    counts = np.fromiter((len(q) for q in scores), dtype=np.int64, count=len(scores))
+    flat = np.fromiter(chain.from_iterable(scores), dtype=float, count=int(counts.sum()))
+    sums = np.bincount(np.repeat(np.arange(len(scores)), counts), weights=flat, minlength=len(scores))
+    return pd.DataFrame({
+        "user_id": _column([s.get('user_id', 'anonymous') for s in snapshots]),
+        "steps": np.array([h.get('steps_last_7_days', 0) for h in health], dtype=float),
+        "sleep": np.array([h.get('sleep_hours_avg', 7) for h in health], dtype=float),
+        "expenses": np.array([expense_total(s.get('finance', {})) for s in snapshots], dtype=float),
+        "quiz_avg": np.divide(sums, counts, out=np.zeros(len(scores)), where=counts > 0),
+        "last_active_days": np.array([l.get('last_active_days', 999) for l in learning], dtype=float),
+    })
+
+
+def cohort_stats(frame: pd.DataFrame, by, columns: Sequence[str] = ("steps", "sleep", "expenses", "quiz_avg")):
+    """Mean, median and count of ``columns`` per cohort (any pandas group-by key)."""
+    return frame.groupby(by, observed=True)[list(columns)].agg(["mean", "median", "count"])
+
+
+# ------------------------------------------------------------
+# NPY CACHE
+# ------------------------------------------------------------
+def export_cache(frame: pd.DataFrame, directory: str):
+    """
+    Write ``frame`` as one ``.npy`` file per column (categories as integer
+    codes) plus ``manifest.json``, so ``load_cache`` can memory-map it.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, "manifest.json")
+    # invalidate the previous cache before its columns are overwritten
+    if os.path.exists(path):
+        os.remove(path)
+    manifest = {"rows": len(frame), "columns": {}}
+    for name in frame.columns:
+        col = frame[name]
+        if isinstance(col.dtype, pd.CategoricalDtype):
+            np.save(os.path.join(directory, f"{name}.npy"), col.cat.codes.to_numpy())
+            manifest["columns"][name] = {"categories": col.cat.categories.tolist()}
+        else:
+            np.save(os.path.join(directory, f"{name}.npy"), col.to_numpy())
+            manifest["columns"][name] = {}
+    # the manifest goes last: a cache without one is incomplete
+    tmp = os.path.join(directory, "manifest.json.tmp")
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp, path)
+
+
+def load_cache(directory: str, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """Rebuild a frame from ``export_cache`` output, reading columns via mmap."""
+    with open(os.path.join(directory, "manifest.json"), 'r') as f:
+        manifest = json.load(f)
+    data = {}
+    for name in columns or manifest["columns"]:
+        meta = manifest["columns"][name]
+        values = np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r')
+        if "categories" in meta:
+            data[name] = pd.Categorical.from_codes(values, meta["categories"])
+        else:
+            data[name] = values
+    return pd.DataFrame(data)
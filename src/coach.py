@@ -0,0 +1,330 @@
+# src/coach.py
+import bisect
+import random
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+# -----------------------------
+# INTENT INDEX
+# -----------------------------
+# Checked in this order: when a message mentions several areas, the earliest
+# intent here wins (e.g. "job" beats "study").
+INTENT_KEYWORDS = (
+    ("career", ("job", "career", "interview", "resume", "dream job", "apply")),
+    ("health", ("health", "sleep", "steps", "exercise", "fitness", "diet", "tired", "weight")),
+    ("finance", ("finance", "money", "salary", "expenses", "budget", "savings")),
+    ("learning", ("learn", "study", "skill", "practice", "course")),
+    ("productivity", ("task", "productivity", "focus", "routine", "todo")),
+)
+GENERAL_INTENT = "general"
+
+_KEYWORD_RANK = {kw: rank
+                 for rank, (_, keywords) in reversed(list(enumerate(INTENT_KEYWORDS)))
+                 for kw in keywords}
+# One alternation over every keyword, wrapped in a lookahead so matches may
+# overlap (substring semantics: "taskill" mentions both "task" and "skill").
+_INTENT_RE = re.compile("(?=(%s))" % "|".join(
+    re.escape(kw) for kw in sorted(_KEYWORD_RANK, key=len, reverse=True)))
+
+
+def _best_rank(matches) -> int:
+    best = len(INTENT_KEYWORDS)
+    for m in matches:
+        rank = _KEYWORD_RANK[m.group(1)]
+        if rank < best:
+            best = rank
+            if rank == 0:
+                break
+    return best
+
+
+def _intent_name(rank: int) -> str:
+    return INTENT_KEYWORDS[rank][0] if rank < len(INTENT_KEYWORDS) else GENERAL_INTENT
+
+
+def classify_intent(message: str) -> str:
+    """Return the chat intent of ``message`` ('career', 'health', ... or 'general')."""
+    return _intent_name(_best_rank(_INTENT_RE.finditer(message.lower())))
+
+
+def classify_intents(messages: Iterable[str]) -> List[str]:
+    """
+    Classify many messages with one regex scan over their concatenation.
+    Same answers as calling ``classify_intent`` on each message.
+    """
+    texts = [m.lower() for m in messages]
+    starts = []
+    offset = 0
+    for t in texts:
+        starts.append(offset)
+        offset += len(t) + 1
+    # "\n" never occurs inside a keyword, so no match can straddle two messages
+    ranks = [len(INTENT_KEYWORDS)] * len(texts)
+    for m in _INTENT_RE.finditer("\n".join(texts)):
+        i = bisect.bisect_right(starts, m.start()) - 1
+        rank = _KEYWORD_RANK[m.group(1)]
+        if rank < ranks[i]:
+            ranks[i] = rank
+    return [_intent_name(r) for r in ranks]
+
+
+# -----------------------------
+# UTIL: Personalized Plan Generator
+# -----------------------------
+def generate_personalized_plans(snapshot: Dict[str, Any], agent_result: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Create personalized short messages for each domain using snapshot values and agent outputs.
+    Returns dictionary with keys: health, finance, learning, productivity -> short message strings.
+    """
+    plans = {}
+
+    # ----- HEALTH -----
+    health_snap = snapshot.get("health", {})
+    steps = health_snap.get("steps_per_day", 0)
+    sleep = health_snap.get("sleep_hours", 0)
+    stress = health_snap.get("stress_level", "low")
+    health_plan_list = agent_result.get("health", {}).get("plan", [])
+    # Personalize
+    health_msgs = []
+    if steps and steps < 5000:
+        health_msgs.append(f"Increase daily steps: you have {steps} steps — aim for +20% or a 20–30 min walk.")
+    else:
+        health_msgs.append(f"Your steps ({steps}) look decent — keep the routine.")
+    if sleep and sleep < 7:
+        health_msgs.append(f"Improve sleep: you average {sleep}h — aim for consistent 7–8h schedule.")
+    if stress in ("high",):
+        health_msgs.append("Stress is high — try short breathing breaks (3–5 min) twice daily.")
+    if health_plan_list:
+        health_msgs.append("Actions: " + " • ".join(health_plan_list[:3]))
+    plans["health"] = " ".join(health_msgs) if health_msgs else agent_result.get("health", {}).get("message", "")
+
+    # ----- FINANCE -----
+    fin_snap = snapshot.get("finance", {})
+    income = fin_snap.get("monthly_income", 0)
+    expenses = fin_snap.get("monthly_expenses", 0)
+    subs = fin_snap.get("subscriptions", [])
+    fin_plan_list = agent_result.get("finance", {}).get("plan", [])
+    fin_msgs = []
+    if income and expenses:
+        balance = income - expenses
+        fin_msgs.append(f"Monthly balance: ₹{balance} ({'surplus' if balance>=0 else 'deficit'}).")
+    if subs:
+        fin_msgs.append(f"Subscriptions: {', '.join(subs)} — consider reviewing them.")
+    if fin_plan_list:
+        fin_msgs.append("Actions: " + " • ".join(fin_plan_list[:2]))
+    plans["finance"] = " ".join(fin_msgs) if fin_msgs else agent_result.get("finance", {}).get("message", "")
+
+    # ----- LEARNING -----
+    learn_snap = snapshot.get("learning", {})
+    study = learn_snap.get("study_minutes_daily", 0)
+    skill = learn_snap.get("current_skill", "")
+    learn_plan_list = agent_result.get("learning", {}).get("plan", [])
+    learn_msgs = []
+    if skill:
+        learn_msgs.append(f"Skill: {skill}.")
+    if study:
+        learn_msgs.append(f"Study time: {study} min/day — try short focused sessions.")
+    if learn_plan_list:
+        learn_msgs.append("Actions: " + " • ".join(learn_plan_list[:2]))
+    else:
+        learn_msgs.append(agent_result.get("learning", {}).get("message", "Keep a consistent learning habit."))
+    plans["learning"] = " ".join(learn_msgs)
+
+    # ----- PRODUCTIVITY -----
+    prod_snap = snapshot.get("productivity", {})
+    tasks = prod_snap.get("tasks", [])
+    completed = prod_snap.get("completed_today", 0)
+    prod_plan = agent_result.get("productivity", {})
+    prod_msgs = []
+    if tasks:
+        prod_msgs.append(f"You listed {len(tasks)} tasks; {completed} completed today.")
+    if prod_plan.get("scheduled"):
+        ev = prod_plan["scheduled"].get("event", {})
+        prod_msgs.append(f"Scheduled: {ev.get('title','task')} at {ev.get('start','TBD')} ({ev.get('duration','TBD')} mins).")
+        more = [m.get("event", {}) for m in prod_plan.get("more", ())]
+        if more:
+            prod_msgs.append("Also booked: " + ", ".join(f"{e.get('title','task')} at {e.get('start','TBD')}" for e in more) + ".")
+    else:
+        prod_msgs.append(prod_plan.get("message", "No tasks scheduled."))
+    plans["productivity"] = " ".join(prod_msgs)
+
+    return plans
+
+
+# -----------------------------
+# ENHANCED CHAT RESPONSE (CONTEXT-AWARE)
+# -----------------------------
+CAREER_REPLIES = (
+    "To get your target job: 1) Define the exact role and 2) tailor your resume to the JD (keywords & projects).",
+    "Build one relevant project and put it on GitHub/portfolio that demonstrates required skills.",
+    "Practice interview problems and behavioral stories. Apply consistently (3–5 roles/day).",
+    "If you share your target role, I can suggest a 30-day plan (projects, skills, interview prep)."
+)
+
+
+def generate_chat_response(message: str, snapshot: Dict[str, Any], agent_result: Dict[str, Any],
+                           seed: Optional[int] = None) -> str:
+    """
+    Context-aware chat replies: uses the user's snapshot and agent result to form specific advice.
+    Falls back to concise domain-driven guidance if message is generic.
+    With ``seed`` the career reply is picked deterministically instead of at random.
+    """
+    return intent_reply(classify_intent(message), snapshot, seed)
+
+
+def intent_reply(intent: str, snapshot: Dict[str, Any], seed: Optional[int] = None) -> str:
+    """Build the reply for an already classified intent."""
+    snapshot = snapshot or {}
+
+    # CAREER / JOB
+    if intent == "career":
+        rng = random if seed is None else random.Random(seed)
+        return rng.choice(CAREER_REPLIES)
+
+    # HEALTH QUESTIONS
+    if intent == "health":
+        health = snapshot.get("health", {})
+        steps = health.get("steps_per_day", 0)
+        sleep = health.get("sleep_hours", 0)
+        suggestions = []
+        if steps and steps < 5000:
+            suggestions.append(f"Walk at least 20–30 minutes daily — you currently do {steps} steps.")
+        if sleep and sleep < 7:
+            suggestions.append(f"Improve sleep routine; aim for 7–8 hours (you average {sleep}h).")
+        suggestions.append("Try short breathing or mindfulness (3–5 minutes) when stressed.")
+        return " ".join(suggestions)
+
+    # FINANCE QUESTIONS
+    if intent == "finance":
+        fin = snapshot.get("finance", {})
+        income = fin.get("monthly_income", 0)
+        expenses = fin.get("monthly_expenses", 0)
+        subs = fin.get("subscriptions", [])
+        advice = []
+        if income and expenses:
+            bal = income - expenses
+            advice.append(f"Your monthly balance is ₹{bal}.")
+            if bal < 0:
+                advice.append("You are spending more than you earn — prioritize reducing expenses or increasing income.")
+        if subs:
+            advice.append(f"Review subscriptions: {', '.join(subs)} — cancel ones you don't use.")
+        advice.append("Track all expenses for 30 days to find quick savings.")
+        return " ".join(advice)
+
+    # LEARNING QUESTIONS
+    if intent == "learning":
+        learning = snapshot.get("learning", {})
+        study = learning.get("study_minutes_daily", 0)
+        advice = []
+        if study and study < 20:
+            advice.append(f"You study {study} min/day — try 15–25 focused minutes using active recall.")
+        advice.append("Use spaced repetition and build a 30-day mini-project aligned to your goal.")
+        return " ".join(advice)
+
+    # PRODUCTIVITY QUESTIONS
+    if intent == "productivity":
+        prod = snapshot.get("productivity", {})
+        tasks = prod.get("tasks", [])
+        completed = prod.get("completed_today", 0)
+        advice = []
+        advice.append(f"You have {len(tasks)} tasks; completed {completed} today.")
+        advice.append("Try the Pomodoro technique (25min focus + 5min break) and pick 3 MITs daily.")
+        return " ".join(advice)
+
+    # GENERAL / DEFAULT
+    return (
+        "Good question — can you be a bit more specific? "
+        "Tell me which area you want to improve (health, finance, learning, productivity, career)."
+    )
+
+
+# -----------------------------
+# CHAT REPLY CACHE
+# -----------------------------
+# Snapshot fields each intent's reply reads; nothing else can change it.
+INTENT_FIELDS = {
+    "career": (),
+    "health": (("health", "steps_per_day"), ("health", "sleep_hours")),
+    "finance": (("finance", "monthly_income"), ("finance", "monthly_expenses"), ("finance", "subscriptions")),
+    "learning": (("learning", "study_minutes_daily"),),
+    "productivity": (("productivity", "tasks"), ("productivity", "completed_today")),
+    GENERAL_INTENT: (),
+}
+
+
+def _freeze(value: Any) -> Any:
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+def snapshot_fingerprint(intent: str, snapshot: Optional[Dict[str, Any]]) -> Tuple:
+    """Canonical, hashable view of the snapshot fields ``intent``'s reply depends on."""
+    snapshot = snapshot or {}
+    return tuple(_freeze((snapshot.get(domain) or {}).get(field))
+                 for domain, field in INTENT_FIELDS[intent])
+
+
+class ChatReplyCache:
+    """
+    Bounded LRU of chat replies keyed on ``(intent, snapshot_fingerprint)``.
+    Career replies are random unless ``seed`` is set, so without a seed they
+    bypass the cache. Safe to share between threads/sessions.
+    """
+    def __init__(self, maxsize: int = 1024, seed: Optional[int] = None):
+        self.maxsize = maxsize
+        self.seed = seed
+        self._entries: "OrderedDict[Tuple, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    def reply(self, message: str, snapshot: Optional[Dict[str, Any]],
+              agent_result: Optional[Dict[str, Any]] = None) -> str:
+        """Same answer as ``generate_chat_response`` (seeded when ``seed`` is set)."""
+        intent = classify_intent(message)
+        if intent == "career" and self.seed is None:
+            with self._lock:
+                self.bypassed += 1
+            return intent_reply(intent, snapshot)
+        key = (intent, snapshot_fingerprint(intent, snapshot))
+        with self._lock:
+            text = self._entries.get(key)
+            if text is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return text
+            self.misses += 1
+        text = intent_reply(intent, snapshot, self.seed)
+        with self._lock:
+            self._entries[key] = text
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return text
+
+    def invalidate(self, snapshot: Optional[Dict[str, Any]]) -> int:
+        """Drop the cached replies built from ``snapshot``; returns how many were removed."""
+        keys = [(intent, snapshot_fingerprint(intent, snapshot))
+                for intent, fields in INTENT_FIELDS.items() if fields]
+        with self._lock:
+            return sum(self._entries.pop(k, None) is not None for k in keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.bypassed = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "bypassed": self.bypassed,
+                    "size": len(self._entries), "maxsize": self.maxsize}
+
+
+# Process-wide cache used by the Streamlit app.
+REPLY_CACHE = ChatReplyCache()
@@ -1,43 +1,727 @@
 # src/memory.py
+"""
+JSON-backed event memory.
+
+Writes are appended to a JSONL log next to the store (``<path>.log``), one
+line per event. The log is folded back into the store once it has grown to
+``checkpoint_ratio`` times the store's size (and holds at least
+``checkpoint_every`` events; 0 disables automatic checkpoints), so the
+amortized cost of saving an event does not grow with history. Opening a
+Memory loads the store and replays whatever is left in the log; inside
+``transaction()`` events are buffered and written in one flush.
+
+Payloads are content-addressed: each distinct payload (and each dict inside
+it, e.g. the domain results nested in ``daily_summary``) is stored once under
+``$payloads`` and events only hold its hash. Reads rehydrate the references
+and return their own copy, so mutating a result cannot corrupt the store.
+
+``retention`` bounds history per key, e.g.
+``{"daily_summary": {"keep_last": 30}, "*": {"max_age_days": 90}}``
+("*" applies to keys without their own rule). It is enforced whenever the
+store is rewritten (checkpoint / compact); dropped events are rolled into a
+per-key summary available from ``get_summary``.
+
+Each rewrite also writes a byte-offset index (``<path>.idx``) that
+``src.memory_index.MemoryReader`` uses to serve reads without loading the
+store. Checkpoints are written with ``codec`` (see ``src.serialization``);
+any format is read back, so a store opened with another codec is converted
+at the next rewrite.
+
+Several processes may share one store: writers serialize on an advisory
+lock (``<path>.lock``) and every read or write first catches up with what
+other processes appended or checkpointed. Events whose payload has a
+``risk`` are also kept in an index on (key, risk, time), so ``query`` and
+``users_with_risk`` answer cohort questions with a binary search.
+``save_event`` and flush latencies go to ``metrics`` when it is enabled.
+Nothing is read or created until the first call that needs the store.
+"""
+import bisect
+import contextvars
+import hashlib
+import heapq
 import json
 import os
-from typing import Any, Dict, List
+import threading
+import time
+from contextlib import contextmanager
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from src.memory_index import write_index, write_store
+from src.metrics import REGISTRY, MetricsRegistry
+from src.results import copy_plain, risk_of, to_plain
+from src.serialization import codec_for, detect_format, get_codec
+
+try:
+    import fcntl
+except ImportError:  # no advisory locks on this platform (e.g. Windows)
+    fcntl = None
 
 MEMORY_FILE = os.path.join(os.path.dirname(__file__), '..', 'data', 'memory_store.json')
 
+# index position of events saved before timestamps existed: only open ranges reach it
+NO_TS = float('-inf')
+
+
+class _Batch(list):
+    """Events buffered by a transaction, and the callbacks undoing it if it fails."""
+    def __init__(self):
+        super().__init__()
+        self.undo: List[Callable[[], None]] = []
+
+
+@contextmanager
+def buffered_transaction(pending: contextvars.ContextVar, flush: Callable[[List], None]):
+    """
+    Shared body of the backends' ``transaction()``: buffer the block's events
+    in ``pending`` and ``flush`` them on exit. If the block or the flush
+    raises, the callbacks registered with ``on_rollback`` run, newest first.
+    """
+    if pending.get() is not None:
+        yield
+        return
+    batch = _Batch()
+    token = pending.set(batch)
+    committed = False
+    try:
+        try:
+            yield
+        finally:
+            pending.reset(token)
+        if batch:
+            flush(batch)
+        committed = True
+    finally:
+        if not committed:
+            for undo in reversed(batch.undo):
+                undo()
+
+
+def add_rollback(pending: contextvars.ContextVar, callback: Callable[[], None]):
+    batch = pending.get()
+    if batch is not None:
+        batch.undo.append(callback)
+
+def intern_payload(payload: Any, stored: Dict[str, Any], new: List[str],
+                   payloads: Optional[Dict[str, Any]] = None, members: bool = True) -> str:
+    """
+    Content hash of ``payload``. Unseen payloads (and dicts directly inside
+    them, stored as ``{"$ref": hash}``) are added to ``stored`` in their
+    stored form, to ``payloads`` as given, and their hashes to ``new``.
+    """
+    value = payload
+    if members and isinstance(payload, dict):
+        value = {
+            k: {'$ref': intern_payload(v, stored, new, payloads, False)} if isinstance(v, dict) else v
+            for k, v in payload.items()
+        }
+    blob = json.dumps(value, sort_keys=True, separators=(',', ':'))
+    h = hashlib.blake2b(blob.encode(), digest_size=16).hexdigest()
+    if h not in stored:
+        stored[h] = value
+        if payloads is not None:
+            payloads[h] = payload
+        new.append(h)
+    return h
+
+
+class EncodedBatch:
+    """
+    Events interned and encoded into log lines away from the store (e.g. in
+    a worker process), so that ``Memory.write_encoded`` only has to append
+    bytes and define the payloads it has not seen.
+    """
+    def __init__(self):
+        # hash -> (stored form, log line), members before the dicts using them
+        self.defs: Dict[str, Tuple[Any, bytes]] = {}
+        # (user_id, key, hash, log line up to the timestamp)
+        self.events: List[Tuple[str, str, str, bytes]] = []
+        self._stored: Dict[str, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    def add(self, user_id: str, key: str, payload: Any):
+        new = []
+        h = intern_payload(to_plain(payload), self._stored, new)
+        for n in new:
+            self.defs[n] = (self._stored[n], json.dumps({"intern": n, "value": self._stored[n]}).encode() + b'\n')
+        head = json.dumps({"user_id": user_id, "key": key, "ref": h, "ts": None})
+        self.events.append((user_id, key, h, head[:-len('null}')].encode()))
+
+    def decoded(self) -> Iterator[Tuple[str, str, Any]]:
+        """``(user_id, key, payload)`` per event, for stores without ``write_encoded``."""
+        payloads: Dict[str, Any] = {}
+        for h, (value, _) in self.defs.items():
+            if isinstance(value, dict):
+                value = {k: payloads[v['$ref']] if isinstance(v, dict) and list(v) == ['$ref'] else v
+                         for k, v in value.items()}
+            payloads[h] = value
+        return ((u, k, payloads[h]) for u, k, h, _ in self.events)
+
+    def __getstate__(self):
+        # the lookup table is only needed while adding
+        return {"defs": self.defs, "events": self.events}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state, _stored={})
+
+
 class Memory:
     """
     Simple JSON-backed memory: stores per-user events and interventions.
     For Kaggle/demo usage this is lightweight and transparent.
     """
-    def __init__(self, path: str = MEMORY_FILE):
+    def __init__(self, path: str = MEMORY_FILE, checkpoint_every: int = 1000,
+                 retention: Optional[Dict[str, Dict]] = None,
+                 metrics: Optional[MetricsRegistry] = None, codec: Any = None,
+                 checkpoint_ratio: float = 0.5):
         self.path = path
-        # init file
-        if not os.path.exists(self.path):
-            with open(self.path, 'w') as f:
-                json.dump({}, f)
+        self.log_path = path + '.log'
+        self.index_path = path + '.idx'
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_ratio = checkpoint_ratio
+        self.retention = retention or {}
+        self.metrics = metrics if metrics is not None else REGISTRY
+        self.codec = get_codec(codec)
+        self._lock = threading.RLock()
+        self._lock_file = None
+        self._lock_depth = 0
+        self._opened = False
+        # events buffered by the enclosing transaction() (per thread / task)
+        self._pending = contextvars.ContextVar('memory_pending', default=None)
+
+    def _open(self):
+        """Create or recover the store and load it (on first use, with _lock held)."""
+        if self._lock_file is None:
+            self._lock_file = open(self.path + '.lock', 'a')
+        if fcntl is not None:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        self._lock_depth += 1
+        try:
+            # init file
+            if not os.path.exists(self.path):
+                with open(self.path, 'w') as f:
+                    json.dump({}, f)
+            self._recover()
+            self._reload(repair=True)
+            self._opened = True
+        finally:
+            self._lock_depth -= 1
+            if fcntl is not None:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool):
+        """Thread lock plus a shared/exclusive flock held across processes."""
+        with self._lock:
+            if not self._opened and not self._lock_depth:
+                self._open()
+            if fcntl is None or self._lock_depth:
+                # nested calls run under the outer (exclusive) lock
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                return
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _signature(self):
+        st = os.stat(self.path)
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _reload(self, repair: bool = False):
+        # hash -> payload as stored on disk (dict members replaced by refs)
+        self._stored: Dict[str, Any] = {}
+        # hash -> rehydrated payload handed out by reads
+        self._payloads: Dict[str, Any] = {}
+        # user_id -> key -> {"count", "first_ts", "last_ts", "risk"} of dropped events
+        self._summaries: Dict[str, Dict[str, Dict]] = {}
+        self._signature_seen = self._signature()
+        # user_id -> key -> [(payload hash, timestamp), ...]
+        self._store = self._load()
+        self._index_all()
+        self._offset = 0
+        self._logged = 0
+        self._replay(repair)
+
+    def _refresh(self, repair: bool = False):
+        """Catch up with checkpoints and appends made by other processes."""
+        if self._signature() != self._signature_seen:
+            self._reload(repair)
+        else:
+            self._replay(repair)
 
     def _load(self) -> Dict:
-        with open(self.path, 'r') as f:
-            return json.load(f)
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        raw = codec_for(detect_format(data), self.codec).loads(data)
+        raw.pop('$format', None)
+        raw.pop('$generation', None)
+        for h, stored in raw.pop('$payloads', {}).items():
+            self._define(h, stored)
+        self._summaries = raw.pop('$summaries', {})
+        store = {}
+        for user_id, keys in raw.items():
+            store[user_id] = {
+                # entries written before interning still carry the payload inline
+                key: [(e['ref'] if 'ref' in e else self._intern(e['payload'], []), e.get('ts'))
+                      for e in entries]
+                for key, entries in keys.items()
+            }
+        return store
+
+    # ------------------------------------------------------------
+    # PAYLOAD INTERNING
+    # ------------------------------------------------------------
+    def _define(self, h: str, stored: Any):
+        self._stored[h] = stored
+        if isinstance(stored, dict):
+            stored = {
+                k: self._payloads[v['$ref']] if isinstance(v, dict) and list(v) == ['$ref'] else v
+                for k, v in stored.items()
+            }
+        self._payloads[h] = stored
+
+    def _intern(self, payload: Any, new: List, members: bool = True) -> str:
+        """Return the payload's hash, recording it in ``new`` if unseen."""
+        return intern_payload(payload, self._stored, new, self._payloads, members)
+
+    # ------------------------------------------------------------
+    # APPEND LOG
+    # ------------------------------------------------------------
+    def _apply(self, user_id: str, key: str, h: str, ts: Optional[float]):
+        self._store.setdefault(user_id, {}).setdefault(key, []).append((h, ts))
+        self._index(user_id, key, h, ts)
+
+    def _replay(self, repair: bool = False):
+        """Apply log lines past the last offset seen on top of the store."""
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, 'rb+' if repair else 'rb') as f:
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # a write still in flight, or torn by a crash; writers
+                    # (repair=True) hold the lock, so for them it is the latter
+                    if repair:
+                        f.truncate(self._offset)
+                    break
+                self._offset += len(line)
+                rec = json.loads(line)
+                if 'intern' in rec:
+                    self._define(rec['intern'], rec['value'])
+                    continue
+                h = rec['ref'] if 'ref' in rec else self._intern(rec['payload'], [])
+                self._apply(rec['user_id'], rec['key'], h, rec.get('ts'))
+                self._logged += 1
+
+    def _recover(self):
+        # A leftover checkpoint file is only valid once the log it replaced is gone.
+        tmp = self.path + '.tmp'
+        if os.path.exists(tmp):
+            if os.path.exists(self.log_path):
+                os.remove(tmp)
+            else:
+                os.replace(tmp, self.path)
+
+    def _checkpoint_due(self) -> bool:
+        if not self.checkpoint_every or self._logged < self.checkpoint_every:
+            return False
+        # log bytes vs store bytes: a rewrite costs O(store), so wait until
+        # the appends since the last one are a fixed fraction of it
+        return self._offset >= self.checkpoint_ratio * self._signature_seen[2]
 
-    def _save(self, obj: Dict):
-        with open(self.path, 'w') as f:
-            json.dump(obj, f, indent=2)
+    def checkpoint(self):
+        """Fold the log into the store and start a fresh log."""
+        with self._file_lock(exclusive=True):
+            self._refresh(repair=True)
+            if not self._logged:
+                return
+            self._enforce_retention()
+            self._rewrite()
+
+    def compact(self):
+        """
+        Apply retention, roll dropped events into summaries, forget payloads
+        no event references any more and rewrite the store from scratch.
+        """
+        with self._file_lock(exclusive=True):
+            self._refresh(repair=True)
+            self._enforce_retention()
+            live = set()
+            for keys in self._store.values():
+                for entries in keys.values():
+                    live.update(h for h, _ in entries)
+            for h in list(live):
+                stored = self._stored[h]
+                if isinstance(stored, dict):
+                    live.update(v['$ref'] for v in stored.values()
+                                if isinstance(v, dict) and list(v) == ['$ref'])
+            for h in [h for h in self._stored if h not in live]:
+                del self._stored[h], self._payloads[h]
+            self._rewrite()
+
+    def _rewrite(self):
+        # The log must exist while the new store is written: _recover treats
+        # a .tmp without a log as complete.
+        open(self.log_path, 'a').close()
+        tmp = self.path + '.tmp'
+        generation = os.urandom(16).hex()
+        size, prefix, positions = write_store(tmp, self.codec, generation, self._stored,
+                                              self._summaries, self._store)
+        # the new index names the new store's generation, so until the store
+        # below is in place readers see a mismatch and don't trust it
+        write_index(self.index_path, self.codec, generation, size, prefix, positions, self._store)
+        os.remove(self.log_path)
+        os.replace(tmp, self.path)
+        self._signature_seen = self._signature()
+        self._offset = 0
+        self._logged = 0
+
+    # ------------------------------------------------------------
+    # SECONDARY INDEX
+    # ------------------------------------------------------------
+    def _index(self, user_id: str, key: str, h: str, ts: Optional[float]):
+        risk = risk_of(self._payloads[h])
+        if risk is None:
+            return
+        # (key, risk) -> [(timestamp, user_id, payload hash), ...] in time order
+        rows = self._risk_index.setdefault((key, risk), [])
+        row = (ts if ts is not None else NO_TS, user_id, h)
+        if not rows or row >= rows[-1]:
+            rows.append(row)
+        else:  # another process's older batch landed after ours
+            bisect.insort(rows, row)
+
+    def _index_all(self):
+        self._risk_index: Dict[Tuple[str, str], List[Tuple[float, str, str]]] = {}
+        for user_id, keys in self._store.items():
+            for key, entries in keys.items():
+                for h, ts in entries:
+                    risk = risk_of(self._payloads[h])
+                    if risk is not None:
+                        self._risk_index.setdefault((key, risk), []).append(
+                            (ts if ts is not None else NO_TS, user_id, h))
+        for rows in self._risk_index.values():
+            rows.sort()
+
+    # ------------------------------------------------------------
+    # RETENTION
+    # ------------------------------------------------------------
+    def _enforce_retention(self):
+        if not self.retention:
+            return
+        now = time.time()
+        dropped = False
+        for user_id, keys in self._store.items():
+            for key, entries in keys.items():
+                rule = self.retention.get(key, self.retention.get('*'))
+                if not rule:
+                    continue
+                start, cutoff = 0, None
+                if rule.get('keep_last') is not None:
+                    start = max(0, len(entries) - rule['keep_last'])
+                if rule.get('max_age_days') is not None:
+                    cutoff = now - rule['max_age_days'] * 86400
+                # events from before timestamps existed have no known age
+                keep = [i >= start and (cutoff is None or ts is None or ts >= cutoff)
+                        for i, (_, ts) in enumerate(entries)]
+                if all(keep):
+                    continue
+                self._summarize(user_id, key, [e for e, k in zip(entries, keep) if not k])
+                keys[key] = [e for e, k in zip(entries, keep) if k]
+                dropped = True
+        if dropped:
+            self._index_all()
+
+    def _summarize(self, user_id: str, key: str, dropped: List):
+        summary = self._summaries.setdefault(user_id, {}).setdefault(
+            key, {"count": 0, "first_ts": None, "last_ts": None, "risk": {}})
+        summary["count"] += len(dropped)
+        for _, ts in dropped:
+            if ts is None:
+                continue
+            if summary["first_ts"] is None or ts < summary["first_ts"]:
+                summary["first_ts"] = ts
+            if summary["last_ts"] is None or ts > summary["last_ts"]:
+                summary["last_ts"] = ts
+        for h, _ in dropped:
+            payload = self._payloads[h]
+            # risk-tiered domains keep a histogram of what was dropped
+            if isinstance(payload, dict) and payload.get('risk'):
+                summary["risk"][payload['risk']] = summary["risk"].get(payload['risk'], 0) + 1
+
+    def _write(self, events: List):
+        def encode(ts: float, new: List[str]):
+            refs, lines = [], []
+            for u, k, p in events:
+                seen = len(new)
+                # result objects are stored in their plain dict form
+                h = self._intern(to_plain(p), new)
+                for n in new[seen:]:
+                    lines.append(json.dumps({"intern": n, "value": self._stored[n]}))
+                lines.append(json.dumps({"user_id": u, "key": k, "ref": h, "ts": ts}))
+                refs.append((u, k, h))
+            return refs, ('\n'.join(lines) + '\n').encode()
+        self._append(encode, len(events))
+
+    def write_encoded(self, batch: EncodedBatch, checkpoint: bool = True):
+        """
+        Append an EncodedBatch in one flush (outside any transaction). With
+        ``checkpoint=False`` a due checkpoint waits for the next write, so a
+        run of batches pays for one rewrite.
+        """
+        def encode(ts: float, new: List[str]):
+            parts = []
+            for h, (stored, line) in batch.defs.items():
+                if h not in self._stored:
+                    self._define(h, stored)
+                    new.append(h)
+                    parts.append(line)
+            stamp = repr(ts).encode() + b'}\n'
+            parts.extend(head + stamp for _, _, _, head in batch.events)
+            return [e[:3] for e in batch.events], b''.join(parts)
+        if batch.events:
+            self._append(encode, len(batch.events), checkpoint)
+
+    def _append(self, encode, count: int, checkpoint: bool = True):
+        """Log the lines ``encode(ts, new)`` returns in one write and apply its (user_id, key, hash) refs."""
+        start = time.perf_counter() if self.metrics.enabled else None
+        ts = time.time()
+        with self._file_lock(exclusive=True):
+            self._refresh(repair=True)
+            new = []
+            try:
+                refs, data = encode(ts, new)
+                # a single write keeps the batch contiguous in the log
+                with open(self.log_path, 'ab') as f:
+                    f.write(data)
+            except BaseException:
+                # payloads of a failed batch were never logged: forget them
+                for n in new:
+                    del self._stored[n], self._payloads[n]
+                raise
+            for u, k, h in refs:
+                self._apply(u, k, h, ts)
+            self._offset += len(data)
+            self._logged += count
+            if checkpoint and self._checkpoint_due():
+                self.checkpoint()
+        if start is not None:
+            self._observe_flush(start, count)
+
+    # ------------------------------------------------------------
+    # PUBLIC API
+    # ------------------------------------------------------------
+    def transaction(self):
+        """
+        Buffer every save_event in the block and write them in one flush on
+        exit. If the block raises, nothing is written. Nested transactions
+        join the outermost one; reads inside the block don't see its events.
+        """
+        return buffered_transaction(self._pending, self._write)
+
+    def on_rollback(self, callback: Callable[[], None]):
+        """Call ``callback`` if the current transaction is not written (no-op outside one)."""
+        add_rollback(self._pending, callback)
+
+    def save_event(self, user_id: str, key: str, payload: Any):
+        start = time.perf_counter() if self.metrics.enabled else None
+        batch = self._pending.get()
+        if batch is not None:
+            batch.append((user_id, key, payload))
+        else:
+            self._write([(user_id, key, payload)])
+        if start is not None:
+            self.metrics.histogram(
+                'memory_save_event_seconds', 'Latency of save_event (buffered or flushed).'
+            ).observe(time.perf_counter() - start, backend='json')
+
+    def _observe_flush(self, start: float, events: int):
+        self.metrics.histogram(
+            'memory_flush_seconds', 'Latency of writing one batch of events.'
+        ).observe(time.perf_counter() - start, backend='json')
+        self.metrics.counter(
+            'memory_events_written_total', 'Events written to storage.'
+        ).inc(events, backend='json')
+
+    def get_recent(self, user_id: str, key: str, limit: int = 10) -> List:
+        with self._file_lock(exclusive=False):
+            self._refresh()
+            entries = self._store.get(user_id, {}).get(key, [])[-limit:]
+            return [{"payload": copy_plain(self._payloads[h])} for h, _ in entries]
+
+    def get_all(self, user_id: str) -> Dict:
+        with self._file_lock(exclusive=False):
+            self._refresh()
+            return {
+                key: [{"payload": copy_plain(self._payloads[h])} for h, _ in entries]
+                for key, entries in self._store.get(user_id, {}).items()
+            }
+
+    def iter_events(self, keys: Optional[Iterable[str]] = None) -> Iterator[Tuple[str, str, Optional[float], Any]]:
+        """``(user_id, key, ts, payload)`` for every event (of ``keys``), per user in write order."""
+        wanted = set(keys) if keys is not None else None
+        with self._file_lock(exclusive=False):
+            self._refresh()
+            rows = [(user_id, key, ts, h)
+                    for user_id, user_keys in self._store.items()
+                    for key, entries in user_keys.items()
+                    if wanted is None or key in wanted
+                    for h, ts in entries]
+        payloads = self._payloads
+        return ((user_id, key, ts, copy_plain(payloads[h])) for user_id, key, ts, h in rows)
+
+    def get_summary(self, user_id: str, key: str) -> Optional[Dict]:
+        """Roll-up of the events retention has dropped for this key, if any."""
+        with self._file_lock(exclusive=False):
+            self._refresh()
+            return self._summaries.get(user_id, {}).get(key)
+
+    def query(self, key: str, risk: Optional[str] = None, since: Optional[float] = None,
+              until: Optional[float] = None) -> List[Dict]:
+        """
+        Events of ``key`` across all users, oldest first, with a ``risk`` tier
+        (any tier when None) and a timestamp in [since, until]. Each row is
+        ``{"user_id", "key", "risk", "ts", "payload"}``. Only risk-tiered
+        events are indexed; events without a timestamp match only open ranges.
+        """
+        return [
+            {"user_id": user_id, "key": key, "risk": tier,
+             "ts": ts if ts != NO_TS else None, "payload": copy_plain(payload)}
+            for ts, user_id, tier, payload in self._query(key, risk, since, until)
+        ]
+
+    def _query(self, key: str, risk: Optional[str], since: Optional[float],
+               until: Optional[float]) -> List[Tuple[float, str, str, Any]]:
+        """``(ts, user_id, tier, shared payload)`` rows of ``query``, in time order."""
+        with self._file_lock(exclusive=False):
+            self._refresh()
+            if risk is not None:
+                tiers = [getattr(risk, 'value', risk)]
+            else:
+                tiers = sorted(r for k, r in self._risk_index if k == key)
+            ts_of = itemgetter(0)
+            slices = []
+            for tier in tiers:
+                rows = self._risk_index.get((key, tier), [])
+                # untimestamped rows sort first and only match when no bound is given
+                lo = 0 if since is None and until is None else bisect.bisect_right(rows, NO_TS, key=ts_of)
+                if since is not None:
+                    lo = max(lo, bisect.bisect_left(rows, since, key=ts_of))
+                hi = len(rows) if until is None else bisect.bisect_right(rows, until, key=ts_of)
+                slices.append([(ts, user_id, tier, h) for ts, user_id, h in rows[lo:hi]])
+            return [(ts, user_id, tier, self._payloads[h]) for ts, user_id, tier, h in heapq.merge(*slices)]
+
+    def users_with_risk(self, key: str, risk: str, since: Optional[float] = None,
+                        until: Optional[float] = None) -> List[str]:
+        """Sorted ids of users with at least one ``risk`` event of ``key`` in [since, until]."""
+        return sorted({user_id for _, user_id, _, _ in self._query(key, risk, since, until)})
+
+
+SHARD_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'memory_shards')
+
+class ShardedMemory:
+    """
+    Memory split into ``shards`` hash buckets under ``directory``, each its
+    own Memory (store, log and lock file). A user always maps to the same
+    bucket, so writers for users in different buckets never contend and
+    writers for the same user serialize on that bucket's lock. Extra keyword
+    arguments (checkpoint_every, checkpoint_ratio, retention, codec) are passed to every shard.
+    """
+    def __init__(self, directory: str = SHARD_DIR, shards: int = 64, **options):
+        self.directory = directory
+        self.shards = shards
+        self.options = options
+        os.makedirs(directory, exist_ok=True)
+        # the bucket count is part of the layout: refuse to reopen with another
+        manifest = os.path.join(directory, 'shards.json')
+        if os.path.exists(manifest):
+            with open(manifest, 'r') as f:
+                existing = json.load(f)['shards']
+            if existing != shards:
+                raise ValueError(f"{directory} was created with {existing} shards, not {shards}")
+        else:
+            with open(manifest, 'w') as f:
+                json.dump({"shards": shards}, f)
+        self._open: Dict[int, Memory] = {}
+        self._lock = threading.Lock()
+        self._pending = contextvars.ContextVar('sharded_memory_pending', default=None)
+
+    def shard_of(self, user_id: str) -> int:
+        digest = hashlib.blake2b(user_id.encode(), digest_size=8).digest()
+        return int.from_bytes(digest, 'big') % self.shards
+
+    def shard(self, index: int) -> Memory:
+        with self._lock:
+            mem = self._open.get(index)
+            if mem is None:
+                path = os.path.join(self.directory, f'shard_{index:03d}.json')
+                mem = self._open[index] = Memory(path, **self.options)
+            return mem
+
+    def existing_shards(self) -> List[int]:
+        return [i for i in range(self.shards)
+                if os.path.exists(os.path.join(self.directory, f'shard_{i:03d}.json'))]
+
+    def transaction(self):
+        """Like Memory.transaction; each shard's share is committed atomically."""
+        return buffered_transaction(self._pending, self._write)
+
+    def on_rollback(self, callback: Callable[[], None]):
+        add_rollback(self._pending, callback)
+
+    def _write(self, batch: List):
+        by_shard: Dict[int, List] = {}
+        for event in batch:
+            by_shard.setdefault(self.shard_of(event[0]), []).append(event)
+        for index in sorted(by_shard):
+            self.shard(index)._write(by_shard[index])
 
     def save_event(self, user_id: str, key: str, payload: Any):
-        store = self._load()
-        if user_id not in store:
-            store[user_id] = {}
-        if key not in store[user_id]:
-            store[user_id][key] = []
-        store[user_id][key].append({"payload": payload})
-        self._save(store)
+        batch = self._pending.get()
+        if batch is not None:
+            batch.append((user_id, key, payload))
+        else:
+            self.shard(self.shard_of(user_id)).save_event(user_id, key, payload)
 
     def get_recent(self, user_id: str, key: str, limit: int = 10) -> List:
-        store = self._load()
-        return store.get(user_id, {}).get(key, [])[-limit:]
+        return self.shard(self.shard_of(user_id)).get_recent(user_id, key, limit)
 
     def get_all(self, user_id: str) -> Dict:
-        store = self._load()
-        return store.get(user_id, {})
+        return self.shard(self.shard_of(user_id)).get_all(user_id)
+
+    def get_summary(self, user_id: str, key: str) -> Optional[Dict]:
+        return self.shard(self.shard_of(user_id)).get_summary(user_id, key)
+
+    def iter_events(self, keys: Optional[Iterable[str]] = None) -> Iterator[Tuple[str, str, Optional[float], Any]]:
+        for index in self.existing_shards():
+            yield from self.shard(index).iter_events(keys)
+
+    def query(self, key: str, risk: Optional[str] = None, since: Optional[float] = None,
+              until: Optional[float] = None) -> List[Dict]:
+        """Memory.query over every shard, merged in time order."""
+        ts_of = lambda row: row["ts"] if row["ts"] is not None else NO_TS
+        return list(heapq.merge(*(self.shard(i).query(key, risk, since, until)
+                                  for i in self.existing_shards()), key=ts_of))
+
+    def users_with_risk(self, key: str, risk: str, since: Optional[float] = None,
+                        until: Optional[float] = None) -> List[str]:
+        return sorted(u for i in self.existing_shards()
+                      for u in self.shard(i).users_with_risk(key, risk, since, until))
+
+    def checkpoint(self):
+        for index in self.existing_shards():
+            self.shard(index).checkpoint()
+
+    def compact(self):
+        for index in self.existing_shards():
+            self.shard(index).compact()
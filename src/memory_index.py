@@ -0,0 +1,351 @@
+# src/memory_index.py
+"""
+Byte-offset index for Memory checkpoints, and a read-only reader using it.
+
+When Memory rewrites its store (in any ``src.serialization`` codec) it
+also writes ``<path>.idx``: fixed-width binary tables locating every
+interned payload and every (user_id, key) event list inside the store
+file. ``MemoryReader`` memory-maps both files and binary-searches the
+tables, so ``get_recent`` decodes only the records it returns. Events
+appended since the last checkpoint are located in the log incrementally
+(by user and key, without decoding payloads) and decoded only when read.
+"""
+import bisect
+import hashlib
+import json
+import math
+import mmap
+import os
+import struct
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.serialization import codec_for
+
+try:
+    import fcntl
+except ImportError:  # no advisory locks on this platform (e.g. Windows)
+    fcntl = None
+
+INDEX_MAGIC = b'MEMIDX02'
+# magic, store format, store generation, bytes up to the generation, store size,
+# payloads, keys, entries, key-name bytes
+HEADER = struct.Struct('<8s8s16sQQQQQQ')
+PAYLOAD = struct.Struct('<16sQI')    # payload hash, offset in store, length
+KEY = struct.Struct('<16sQHQI')      # user hash, name offset, name length, first entry, count
+ENTRY = struct.Struct('<Id')         # payload slot, timestamp (NaN = unknown)
+
+# how Memory's log lines for a payload definition start
+INTERN_LINE = b'{"intern": "'
+
+
+def _user_hash(user_id: str) -> bytes:
+    return hashlib.blake2b(user_id.encode(), digest_size=16).digest()
+
+
+def _event_prefix(user_id: str, key: Optional[str] = None) -> bytes:
+    """How Memory's log lines for events of ``user_id`` (and ``key``) start."""
+    head = '{"user_id": ' + json.dumps(user_id) + ', "key": '
+    return (head if key is None else head + json.dumps(key) + ', ').encode()
+
+
+def write_store(path: str, codec, generation: str, stored: Dict[str, Any], summaries: Dict,
+                store: Dict[str, Dict[str, List]]) -> Tuple[int, int, Dict[str, Tuple[int, int]]]:
+    """
+    Write the checkpoint (same document Memory._load reads) with ``codec``.
+    Returns its size, the offset just past the generation value and the
+    (offset, length) of every encoded payload value in it.
+    """
+    dumps, sep, kv = codec.dumps, codec.item_sep, codec.key_sep
+    positions = {}
+    pos = 0
+    with open(path, 'wb') as f:
+        def put(data: bytes) -> int:
+            nonlocal pos
+            f.write(data)
+            start, pos = pos, pos + len(data)
+            return start
+
+        put(codec.open_map(4 + len(store)) + dumps('$format') + kv + dumps(codec.format)
+            + sep + dumps('$generation') + kv + dumps(generation))
+        prefix = pos
+        put(sep + dumps('$payloads') + kv + codec.open_map(len(stored)))
+        for i, (h, value) in enumerate(stored.items()):
+            put((sep if i else b'') + dumps(h) + kv)
+            blob = dumps(value)
+            positions[h] = (put(blob), len(blob))
+        put(codec.close_map + sep + dumps('$summaries') + kv + dumps(summaries))
+        for user_id, keys in store.items():
+            put(sep + dumps(user_id) + kv + codec.open_map(len(keys)) + sep.join(
+                dumps(key) + kv + dumps([{"ref": h, "ts": ts} for h, ts in entries])
+                for key, entries in keys.items()) + codec.close_map)
+        put(codec.close_map)
+        f.flush()
+        os.fsync(f.fileno())
+    return pos, prefix, positions
+
+
+def write_index(path: str, codec, generation: str, store_size: int, prefix: int,
+                positions: Dict[str, Tuple[int, int]], store: Dict[str, Dict[str, List]]):
+    """Write the ``.idx`` tables for a store just produced by ``write_store``."""
+    hashes = sorted(positions)
+    slot = {h: i for i, h in enumerate(hashes)}
+    # grouped by user hash for bisect; a user's keys keep their store order
+    keys = sorted(((_user_hash(user_id), i, key, entries)
+                   for user_id, user_keys in store.items()
+                   for i, (key, entries) in enumerate(user_keys.items())),
+                  key=lambda row: row[:2])
+    names = bytearray()
+    key_rows, entry_rows = [], []
+    for user_hash, _, key, entries in keys:
+        name = key.encode()
+        key_rows.append(KEY.pack(user_hash, len(names), len(name), len(entry_rows), len(entries)))
+        names += name
+        entry_rows.extend(ENTRY.pack(slot[h], ts if ts is not None else math.nan) for h, ts in entries)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(INDEX_MAGIC, codec.format.encode(), bytes.fromhex(generation),
+                            prefix, store_size, len(hashes), len(key_rows), len(entry_rows), len(names)))
+        f.write(b''.join(PAYLOAD.pack(bytes.fromhex(h), *positions[h]) for h in hashes))
+        f.write(b''.join(key_rows))
+        f.write(b''.join(entry_rows))
+        f.write(bytes(names))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class _Column:
+    """Sequence view of one leading field of a fixed-width table (for bisect)."""
+    def __init__(self, buf, start: int, count: int, record: int, width: int):
+        self.buf, self.start, self.count = buf, start, count
+        self.record, self.width = record, width
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, i: int) -> bytes:
+        off = self.start + i * self.record
+        return self.buf[off:off + self.width]
+
+
+class MemoryReader:
+    """
+    Read-only view of a Memory store (``get_recent`` / ``get_all``) that
+    never parses the whole checkpoint. Cost depends on the records returned,
+    not on the store size: log lines appended since the checkpoint are found
+    with a byte search from the end of the log, and only the ones returned
+    are decoded. Stores without a matching
+    ``.idx`` (written before this index existed, or never checkpointed) are
+    read through a regular Memory instead.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.log_path = path + '.log'
+        self.index_path = path + '.idx'
+        self._lock_file = open(path + '.lock', 'a')
+        self._signature = None
+        self._store_map = self._index_map = None
+        self._indexed_ok = False
+        self._fallback = None
+        self._log = None
+        self._log_end = 0
+
+    def close(self):
+        self._close_maps()
+        self._lock_file.close()
+
+    # ------------------------------------------------------------
+    # OPENING / REFRESH
+    # ------------------------------------------------------------
+    def _read(self, name: str, *args):
+        """Run ``_<name>`` under the shared store lock, or Memory.<name> without an index."""
+        if fcntl is not None:
+            fcntl.flock(self._lock_file, fcntl.LOCK_SH)
+        try:
+            self._refresh()
+            if self._indexed_ok:
+                self._open_log()
+                try:
+                    return getattr(self, '_' + name)(*args)
+                finally:
+                    self._close_log()
+        finally:
+            if fcntl is not None:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+        # outside our flock: Memory takes its own (exclusive) lock when opening
+        if self._fallback is None:
+            from src.memory import Memory
+            self._fallback = Memory(self.path, checkpoint_every=0)
+        return getattr(self._fallback, name)(*args)
+
+    def _map(self):
+        self._close_maps()
+        st = os.stat(self.path)
+        self._signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+        self._indexed_ok = self._valid_index(st.st_size)
+        if self._indexed_ok:
+            self._fallback = None
+
+    def _close_maps(self):
+        for m in (self._store_map, self._index_map):
+            if m is not None:
+                m.close()
+        self._store_map = self._index_map = None
+
+    def _valid_index(self, store_size: int) -> bool:
+        if not os.path.exists(self.index_path) or not store_size:
+            return False
+        with open(self.path, 'rb') as f:
+            store_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        with open(self.index_path, 'rb') as f:
+            index_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, fmt, generation, prefix, size, n_payloads, n_keys, n_entries, _ = \
+            HEADER.unpack_from(index_map, 0)
+        # the store names its generation in its first bytes; a stale index can't match
+        if (magic != INDEX_MAGIC or size != store_size
+                or generation.hex().encode() not in store_map[:prefix]):
+            store_map.close()
+            index_map.close()
+            return False
+        self._codec = codec_for(fmt.rstrip(b'\0').decode())
+        self._store_map, self._index_map = store_map, index_map
+        self._payload_start = HEADER.size
+        self._key_start = self._payload_start + n_payloads * PAYLOAD.size
+        self._entry_start = self._key_start + n_keys * KEY.size
+        self._names_start = self._entry_start + n_entries * ENTRY.size
+        self._payload_hashes = _Column(index_map, self._payload_start, n_payloads, PAYLOAD.size, 16)
+        self._key_users = _Column(index_map, self._key_start, n_keys, KEY.size, 16)
+        return True
+
+    def _refresh(self):
+        st = os.stat(self.path)
+        if (st.st_ino, st.st_mtime_ns, st.st_size) != self._signature:
+            self._map()
+
+    def _open_log(self):
+        """Map the log appended since the checkpoint, up to its last complete line."""
+        try:
+            f = open(self.log_path, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            if os.fstat(f.fileno()).st_size:
+                self._log = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._log_end = self._log.rfind(b'\n') + 1
+
+    def _close_log(self):
+        if self._log is not None:
+            self._log.close()
+        self._log, self._log_end = None, 0
+
+    def _tail_lines(self, prefix: bytes, limit: Optional[int] = None,
+                    before: Optional[int] = None) -> List[Tuple[int, bytes]]:
+        """
+        (offset, line) of the last ``limit`` (default: all) log lines that
+        start with ``prefix`` and end before ``before``, oldest first.
+        """
+        log, out = self._log, []
+        end = self._log_end if before is None else before
+        while log is not None and (limit is None or len(out) < limit):
+            i = log.rfind(prefix, 0, end)
+            if i < 0:
+                break
+            if i == 0 or log[i - 1] == 0x0A:  # a line start, not text inside a payload
+                out.append((i, log[i:log.find(b'\n', i) + 1]))
+            end = i
+        out.reverse()
+        return out
+
+    # ------------------------------------------------------------
+    # DECODING
+    # ------------------------------------------------------------
+    def _stored(self, h: str, before: Optional[int] = None) -> Tuple[Any, Optional[int]]:
+        """
+        The stored form of ``h`` and, if it was defined in the log, where
+        (definitions precede their first use, so the search starts at ``before``).
+        """
+        try:
+            return self._stored_at(self._slot(h)), None
+        except KeyError:  # defined since the checkpoint
+            lines = self._tail_lines(INTERN_LINE + h.encode(), 1, before)
+            if not lines:
+                raise
+            offset, line = lines[0]
+            return json.loads(line)['value'], offset
+
+    def _slot(self, h: str) -> int:
+        target = bytes.fromhex(h)
+        i = bisect.bisect_left(self._payload_hashes, target)
+        if i == len(self._payload_hashes) or self._payload_hashes[i] != target:
+            raise KeyError(h)
+        return i
+
+    def _stored_at(self, slot: int) -> Any:
+        _, offset, length = PAYLOAD.unpack_from(self._index_map, self._payload_start + slot * PAYLOAD.size)
+        return self._codec.loads(self._store_map[offset:offset + length])
+
+    def _hydrate(self, stored: Any, before: Optional[int] = None) -> Any:
+        if isinstance(stored, dict):
+            return {k: self._stored(v['$ref'], before)[0] if isinstance(v, dict) and list(v) == ['$ref'] else v
+                    for k, v in stored.items()}
+        return stored
+
+    def _keys_of(self, user_id: str):
+        """(key name, first entry, count) of every indexed key of ``user_id``."""
+        target = _user_hash(user_id)
+        lo = bisect.bisect_left(self._key_users, target)
+        hi = bisect.bisect_right(self._key_users, target, lo)
+        for i in range(lo, hi):
+            _, name_off, name_len, first, count = KEY.unpack_from(self._index_map, self._key_start + i * KEY.size)
+            start = self._names_start + name_off
+            yield self._index_map[start:start + name_len].decode(), first, count
+
+    def _indexed(self, first: int, count: int) -> List[Dict]:
+        out = []
+        for i in range(first, first + count):
+            slot, _ = ENTRY.unpack_from(self._index_map, self._entry_start + i * ENTRY.size)
+            out.append({"payload": self._hydrate(self._stored_at(slot))})
+        return out
+
+    def _tailed(self, lines: List[Tuple[int, bytes]]) -> List[Dict]:
+        out = []
+        for offset, line in lines:
+            rec = json.loads(line)
+            if 'ref' not in rec:  # written before interning: the payload is inline
+                out.append({"payload": rec['payload']})
+                continue
+            stored, defined = self._stored(rec['ref'], offset)
+            out.append({"payload": self._hydrate(stored, defined)})
+        return out
+
+    # ------------------------------------------------------------
+    # PUBLIC API (same shapes as Memory)
+    # ------------------------------------------------------------
+    def get_recent(self, user_id: str, key: str, limit: int = 10) -> List:
+        return self._read('get_recent', user_id, key, limit)
+
+    def _get_recent(self, user_id: str, key: str, limit: int) -> List:
+        first = count = 0
+        for name, name_first, name_count in self._keys_of(user_id):
+            if name == key:
+                first, count = name_first, name_count
+                break
+        prefix = _event_prefix(user_id, key)
+        if limit > 0:
+            tail = self._tail_lines(prefix, limit)
+            n = min(count, limit - len(tail))
+            return self._indexed(first + count - n, n) + self._tailed(tail)
+        tail = self._tail_lines(prefix)
+        # same window as Memory's ``entries[-limit:]``, over checkpoint + tail
+        start = range(count + len(tail))[-limit:].start
+        head = self._indexed(first + start, count - start) if start < count else []
+        return head + self._tailed(tail[max(start - count, 0):])
+
+    def get_all(self, user_id: str) -> Dict:
+        return self._read('get_all', user_id)
+
+    def _get_all(self, user_id: str) -> Dict:
+        out = {name: self._indexed(first, count) for name, first, count in self._keys_of(user_id)}
+        for offset, line in self._tail_lines(_event_prefix(user_id)):
+            out.setdefault(json.loads(line)['key'], []).extend(self._tailed([(offset, line)]))
+        return out
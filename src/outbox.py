@@ -0,0 +1,300 @@
+# src/outbox.py
+import smtplib
+import threading
+import time
+from collections import deque
+from email.message import EmailMessage
+from typing import Deque, Dict, List, Optional
+
+from src.metrics import REGISTRY, MetricsRegistry
+
+
+# ------------------------------------------------------------
+# TRANSPORTS
+# ------------------------------------------------------------
+class PartialDelivery(Exception):
+    """A batch failed part-way; ``undelivered`` are the messages not sent (in order)."""
+    def __init__(self, undelivered: List[Dict]):
+        super().__init__(f"{len(undelivered)} message(s) not delivered")
+        self.undelivered = undelivered
+
+
+class MemoryTransport:
+    """Keeps delivered messages in ``sent`` (the outbox default, like EmailTool)."""
+    def __init__(self):
+        self.sent: List[Dict] = []
+
+    def send_batch(self, messages: List[Dict]):
+        self.sent.extend(messages)
+
+
+class SmtpTransport:
+    """
+    Sends batches over pooled, long-lived SMTP connections. At most
+    ``pool_size`` connections are open; each batch borrows one and a dropped
+    connection is reopened once before the error is raised.
+    """
+    def __init__(self, host: str = 'localhost', port: int = 25, sender: str = 'coach@localhost',
+                 username: Optional[str] = None, password: Optional[str] = None,
+                 starttls: bool = False, pool_size: int = 2, timeout: float = 10.0):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._idle: List[smtplib.SMTP] = []
+        self._open = 0
+        self._cond = threading.Condition()
+
+    def _connect(self) -> smtplib.SMTP:
+        conn = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            conn.starttls()
+        if self.username:
+            conn.login(self.username, self.password or '')
+        return conn
+
+    def _acquire(self) -> smtplib.SMTP:
+        with self._cond:
+            while not self._idle and self._open >= self.pool_size:
+                self._cond.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._open += 1
+        try:
+            return self._connect()
+        except Exception:
+            self._discard()
+            raise
+
+    def _release(self, conn: smtplib.SMTP):
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def _discard(self):
+        with self._cond:
+            self._open -= 1
+            self._cond.notify()
+
+    def _message(self, rec: Dict) -> EmailMessage:
+        msg = EmailMessage()
+        msg['From'] = self.sender
+        msg['To'] = rec['to']
+        msg['Subject'] = rec['subject']
+        msg.set_content(rec['body'])
+        return msg
+
+    def send_batch(self, messages: List[Dict]):
+        """Send in order; if a later message fails, raise PartialDelivery with the rest."""
+        conn = self._acquire()
+        sent = 0
+        try:
+            for rec in messages:
+                try:
+                    conn.send_message(self._message(rec))
+                except smtplib.SMTPServerDisconnected:
+                    conn.close()
+                    conn = self._connect()
+                    conn.send_message(self._message(rec))
+                sent += 1
+        except Exception as exc:
+            conn.close()
+            self._discard()
+            if sent:
+                raise PartialDelivery(messages[sent:]) from exc
+            raise
+        self._release(conn)
+
+    def close(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for conn in idle:
+            try:
+                conn.quit()
+            except smtplib.SMTPException:
+                conn.close()
+
+
+# ------------------------------------------------------------
+# OUTBOX
+# ------------------------------------------------------------
+class Outbox:
+    """
+    Asynchronous email outbox with the same ``send`` signature as EmailTool,
+    so it can be handed to Agent as its ``email`` tool.
+
+    ``send`` only queues the message and returns immediately; a background
+    dispatcher thread delivers due messages through ``transport`` in batches
+    of up to ``batch_size``. Messages to one recipient queued within
+    ``digest_window`` seconds of the first are coalesced into a single digest.
+    A recipient gets at most ``rate_limit`` emails per ``rate_period``
+    seconds (0 = unlimited); while limited, new alerts keep joining the
+    pending digest. Messages a failed batch did not deliver, and whatever is
+    still queued at ``close``, are kept in ``failed``.
+    """
+    def __init__(self, transport=None, batch_size: int = 50, digest_window: float = 0.0,
+                 rate_limit: int = 0, rate_period: float = 3600.0, poll_interval: float = 0.05,
+                 metrics: MetricsRegistry = None):
+        self.transport = transport if transport is not None else MemoryTransport()
+        self.batch_size = batch_size
+        self.digest_window = digest_window
+        self.rate_limit = rate_limit
+        self.rate_period = rate_period
+        self.poll_interval = poll_interval
+        self.metrics = metrics if metrics is not None else REGISTRY
+        self.failed: List[Dict] = []
+        # recipient -> [first enqueue time, messages]; dicts keep FIFO order
+        self._pending: Dict[str, list] = {}
+        self._history: Dict[str, Deque[float]] = {}
+        self._inflight = 0
+        self._force = 0
+        self._stopped = False
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def sent(self) -> List[Dict]:
+        """Delivered messages, when the transport records them (MemoryTransport)."""
+        return getattr(self.transport, 'sent', [])
+
+    def send(self, to_email: str, subject: str, body: str) -> Dict:
+        rec = {"to": to_email, "subject": subject, "body": body}
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("outbox is closed")
+            bucket = self._pending.get(to_email)
+            if bucket is None:
+                self._pending[to_email] = [time.monotonic(), [rec]]
+            else:
+                bucket[1].append(rec)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._dispatch, name='outbox', daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+        if self.metrics.enabled:
+            self.metrics.counter('outbox_queued_total', 'Emails queued in the outbox.').inc()
+        return {"status": "queued", "record": rec}
+
+    def pending(self) -> int:
+        with self._cond:
+            return sum(len(b[1]) for b in self._pending.values())
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Deliver everything queued now, ignoring the digest window. Recipients
+        over their rate limit stay queued. Returns False on timeout.
+        """
+        with self._cond:
+            self._force += 1
+            self._cond.notify_all()
+            try:
+                return self._cond.wait_for(
+                    lambda: not self._inflight and not any(
+                        self._allowed(r, time.monotonic()) for r in self._pending), timeout)
+            finally:
+                self._force -= 1
+
+    def close(self, timeout: Optional[float] = None):
+        """
+        Flush, stop the dispatcher and close the transport. Messages still
+        queued (e.g. held back by the rate limit) are moved to ``failed``.
+        """
+        self.flush(timeout)
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        with self._cond:
+            left = [self._digest(messages) for _, messages in self._pending.values()]
+            self._pending.clear()
+        if left:
+            self.failed.extend(left)
+            if self.metrics.enabled:
+                self.metrics.counter(
+                    'outbox_undelivered_total', 'Emails still queued when the outbox closed.').inc(len(left))
+        close = getattr(self.transport, 'close', None)
+        if close is not None:
+            close()
+
+    # ------------------------------------------------------------
+    # DISPATCHER
+    # ------------------------------------------------------------
+    def _allowed(self, to_email: str, now: float) -> bool:
+        if not self.rate_limit:
+            return True
+        sent = self._history.get(to_email)
+        if sent is None:
+            return True
+        while sent and now - sent[0] >= self.rate_period:
+            sent.popleft()
+        return len(sent) < self.rate_limit
+
+    def _take_due(self, now: float) -> List[Dict]:
+        """Pop up to ``batch_size`` due recipients (called with the lock held)."""
+        batch = []
+        for to_email, (first, messages) in list(self._pending.items()):
+            if len(batch) >= self.batch_size:
+                break
+            if not self._force and now - first < self.digest_window:
+                continue
+            if not self._allowed(to_email, now):
+                continue
+            del self._pending[to_email]
+            if self.rate_limit:
+                self._history.setdefault(to_email, deque()).append(now)
+            batch.append(self._digest(messages))
+        return batch
+
+    @staticmethod
+    def _digest(messages: List[Dict]) -> Dict:
+        if len(messages) == 1:
+            return messages[0]
+        latest = messages[-1]
+        return {
+            "to": latest["to"],
+            "subject": f"{latest['subject']} ({len(messages)} updates)",
+            "body": "\n\n---\n\n".join(m["body"] for m in messages),
+            "coalesced": len(messages),
+        }
+
+    def _dispatch(self):
+        while True:
+            with self._cond:
+                batch = self._take_due(time.monotonic())
+                if not batch:
+                    if self._stopped:
+                        return
+                    self._cond.notify_all()
+                    self._cond.wait(self.poll_interval)
+                    continue
+                self._inflight += 1
+            try:
+                self._deliver(batch)
+            finally:
+                with self._cond:
+                    self._inflight -= 1
+                    self._cond.notify_all()
+
+    def _deliver(self, batch: List[Dict]):
+        start = time.perf_counter()
+        failed: List[Dict] = []
+        try:
+            self.transport.send_batch(batch)
+        except Exception as exc:
+            # only what the transport did not deliver (all of it unless it says otherwise)
+            failed = getattr(exc, 'undelivered', batch)
+            self.failed.extend(failed)
+            if self.metrics.enabled:
+                self.metrics.counter('outbox_failed_total', 'Emails whose batch failed to send.').inc(len(failed))
+        if self.metrics.enabled and len(failed) < len(batch):
+            self.metrics.counter('outbox_sent_total', 'Emails delivered (a digest counts once).').inc(
+                len(batch) - len(failed))
+            if not failed:
+                self.metrics.histogram('outbox_batch_seconds', 'Latency of one transport batch.').observe(
+                    time.perf_counter() - start)
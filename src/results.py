@@ -0,0 +1,133 @@
+# src/results.py
+from collections.abc import Mapping
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Dict, Optional, Tuple
+
+from src.tools import summarize_plan
+
+
+class Risk(str, Enum):
+    """Risk tier; compares equal to its plain string ('low', 'medium', 'high')."""
+    LOW = 'low'
+    MEDIUM = 'medium'
+    HIGH = 'high'
+
+    def __str__(self):
+        return self.value
+
+
+class _Result(Mapping):
+    """
+    Read-only mapping view over a slotted result, so callers that index
+    results like the old dicts (``r['plan']``, ``r.get('risk')``) keep working.
+    ``message`` is rendered on access; ``to_dict`` gives the plain-JSON form
+    that Memory stores.
+    """
+    __slots__ = ()
+    _keys: Tuple[str, ...] = ()
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._keys:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def to_dict(self) -> Dict:
+        out = {}
+        for key in self._keys:
+            value = getattr(self, key)
+            if isinstance(value, Risk):
+                value = value.value
+            elif isinstance(value, tuple):
+                value = list(value)
+            out[key] = value
+        return out
+
+
+@dataclass(slots=True, eq=False)
+class HealthResult(_Result):
+    risk: Risk
+    plan: Tuple[str, ...]
+    domain = 'health'
+    _keys = ('domain', 'risk', 'plan', 'message')
+
+    @property
+    def message(self) -> str:
+        return f"Health plan: {summarize_plan(self.plan)}"
+
+
+@dataclass(slots=True, eq=False)
+class LearningResult(_Result):
+    risk: Risk
+    plan: Tuple[str, ...]
+    domain = 'learning'
+    _keys = ('domain', 'risk', 'plan', 'message')
+
+    @property
+    def message(self) -> str:
+        return f"Learning plan: {summarize_plan(self.plan)}"
+
+
+@dataclass(slots=True, eq=False)
+class FinanceResult(_Result):
+    total: float
+    alert: Optional[str]
+    plan: Tuple[str, ...]
+    domain = 'finance'
+    _keys = ('domain', 'total', 'alert', 'plan', 'message')
+
+    @property
+    def message(self) -> str:
+        return f"Finance plan: {self.plan[0]} • {self.plan[1]}"
+
+
+@dataclass(slots=True, eq=False)
+class ProductivityResult(_Result):
+    scheduled: Optional[Dict]
+    title: Optional[str] = None
+    more: Tuple[Dict, ...] = ()
+    domain = 'productivity'
+    _keys = ('domain', 'scheduled', 'more', 'message')
+
+    @property
+    def message(self) -> str:
+        if self.scheduled is None:
+            return "No tasks to schedule"
+        if self.more:
+            return f"Scheduled: {self.title} (+{len(self.more)} more)"
+        return f"Scheduled: {self.title}"
+
+
+def to_plain(value: Any) -> Any:
+    """Replace result objects (also inside dicts/lists) with their dict form."""
+    if isinstance(value, _Result):
+        return value.to_dict()
+    if isinstance(value, dict):
+        return {k: to_plain(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [to_plain(v) for v in value]
+    return value
+
+
+def copy_plain(value: Any) -> Any:
+    """Copy of a stored payload: fresh dicts and lists, shared scalars."""
+    if isinstance(value, dict):
+        return {k: copy_plain(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [copy_plain(v) for v in value]
+    return value
+
+
+def risk_of(payload: Any) -> Optional[str]:
+    """The plain risk tier of a stored payload, or None if it has none."""
+    if isinstance(payload, dict):
+        risk = payload.get('risk')
+        if isinstance(risk, str):
+            return getattr(risk, 'value', risk)
+    return None
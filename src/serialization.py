@@ -0,0 +1,120 @@
+# src/serialization.py
+"""
+Codecs for Memory checkpoints.
+
+A codec turns the store document into bytes and back. Two on-disk formats
+exist: ``json`` (written by the stdlib ``json`` codec, or by ``orjson``
+when installed) and ``msgpack``. Every checkpoint names its format in a
+leading ``$format`` field, and readers pick the decoder from the file, so a
+store written with one codec opens with any other and is converted on the
+next rewrite.
+
+    get_codec('msgpack')    # MsgpackCodec, or JsonCodec without msgpack
+    detect_format(data)     # 'json' / 'msgpack' from a store's first bytes
+"""
+import json
+import struct
+from importlib.util import find_spec
+from typing import Any, Optional
+
+
+class JsonCodec:
+    """Compact stdlib JSON (no indentation or spaces)."""
+    name = 'json'
+    format = 'json'
+    close_map = b'}'
+    item_sep = b','
+    key_sep = b':'
+
+    def dumps(self, obj: Any) -> bytes:
+        return json.dumps(obj, separators=(',', ':')).encode()
+
+    def loads(self, data: bytes) -> Any:
+        return json.loads(data)
+
+    def open_map(self, size: int) -> bytes:
+        return b'{'
+
+
+class OrjsonCodec(JsonCodec):
+    """Same JSON format as JsonCodec, encoded and parsed by orjson."""
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson  # optional, and slow to import: only when this codec is used
+        self._orjson = orjson
+
+    def dumps(self, obj: Any) -> bytes:
+        # unlike the stdlib codec, NaN and infinities are written as null
+        try:
+            return self._orjson.dumps(obj)
+        except TypeError:  # e.g. non-str dict keys, which stdlib json coerces
+            return super().dumps(obj)
+
+    def loads(self, data: bytes) -> Any:
+        try:
+            return self._orjson.loads(data)
+        except self._orjson.JSONDecodeError:  # NaN/Infinity written by the stdlib codec
+            return json.loads(data)
+
+
+class MsgpackCodec:
+    """MessagePack; maps are written with their size up front."""
+    name = 'msgpack'
+    format = 'msgpack'
+    close_map = b''
+    item_sep = b''
+    key_sep = b''
+
+    def __init__(self):
+        import msgpack
+        self._msgpack = msgpack
+
+    def dumps(self, obj: Any) -> bytes:
+        return self._msgpack.packb(obj, use_bin_type=True)
+
+    def loads(self, data: bytes) -> Any:
+        return self._msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+    def open_map(self, size: int) -> bytes:
+        if size < 16:
+            return bytes([0x80 | size])
+        if size < 1 << 16:
+            return b'\xde' + struct.pack('>H', size)
+        return b'\xdf' + struct.pack('>I', size)
+
+
+CODECS = {'json': JsonCodec, 'orjson': OrjsonCodec, 'msgpack': MsgpackCodec}
+AVAILABLE = {'json': True, 'orjson': find_spec('orjson') is not None,
+             'msgpack': find_spec('msgpack') is not None}
+
+
+def get_codec(codec: Any = None):
+    """
+    A codec instance from a name ('json', 'orjson', 'msgpack') or an
+    instance. None means compact stdlib JSON; a codec whose package is not
+    installed falls back to it.
+    """
+    if codec is None:
+        return JsonCodec()
+    if not isinstance(codec, str):
+        return codec
+    if codec not in CODECS:
+        raise ValueError(f"unknown codec: {codec!r}")
+    return CODECS[codec]() if AVAILABLE[codec] else JsonCodec()
+
+
+def detect_format(data: bytes) -> str:
+    """'json' for stores starting with ``{`` (all stores before codecs existed), else 'msgpack'."""
+    return 'json' if data[:16].lstrip()[:1] in (b'{', b'') else 'msgpack'
+
+
+def codec_for(fmt: str, preferred: Optional[Any] = None):
+    """A codec that can read ``fmt``: ``preferred`` if it writes that format, else the fastest installed."""
+    if preferred is not None and preferred.format == fmt:
+        return preferred
+    if fmt == 'msgpack':
+        if not AVAILABLE['msgpack']:
+            raise RuntimeError("this store was written with msgpack; install msgpack to read it")
+        return MsgpackCodec()
+    return OrjsonCodec() if AVAILABLE['orjson'] else JsonCodec()
@@ -0,0 +1,179 @@
+# src/sqlite_memory.py
+import contextvars
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from src.memory import add_rollback, buffered_transaction
+from src.metrics import REGISTRY, MetricsRegistry
+from src.results import risk_of, to_plain
+
+SQLITE_FILE = os.path.join(os.path.dirname(__file__), '..', 'data', 'memory_store.db')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    ts REAL,
+    risk TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_events_user_key_seq ON events (user_id, key, seq);
+"""
+
+# created after _migrate, which adds ts/risk to databases from before they existed
+INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_events_key_risk_ts ON events (key, risk, ts) WHERE risk IS NOT NULL;
+"""
+
+class SqliteMemory:
+    """
+    SQLite-backed memory with the same API as ``src.memory.Memory``.
+    Events are indexed on (user_id, key, seq), so ``get_recent`` reads only
+    the rows it returns, and risk-tiered events also on (key, risk, ts) for
+    ``query`` / ``users_with_risk``. The database runs in WAL mode: readers
+    (e.g. the Streamlit app) never block a batch job that is writing.
+    """
+    def __init__(self, path: str = SQLITE_FILE, metrics: Optional[MetricsRegistry] = None):
+        self.path = path
+        self.metrics = metrics if metrics is not None else REGISTRY
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+        self._conn.executescript(INDEXES)
+        self._pending = contextvars.ContextVar('sqlite_memory_pending', default=None)
+
+    def close(self):
+        self._conn.close()
+
+    def _migrate(self):
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(events)")}
+        if 'ts' in columns:
+            return
+        self._conn.execute("BEGIN")
+        self._conn.execute("ALTER TABLE events ADD COLUMN ts REAL")
+        self._conn.execute("ALTER TABLE events ADD COLUMN risk TEXT")
+        # old rows keep ts NULL (age unknown) but become visible to risk queries
+        self._conn.execute("UPDATE events SET risk = json_extract(payload, '$.risk') "
+                           "WHERE json_valid(payload) AND json_type(payload, '$.risk') = 'text'")
+        self._conn.execute("COMMIT")
+
+    def _write(self, events: List):
+        start = time.perf_counter() if self.metrics.enabled else None
+        ts = time.time()
+        rows = []
+        for u, k, p in events:
+            plain = to_plain(p)
+            rows.append((u, k, json.dumps(plain), ts, risk_of(plain)))
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO events (user_id, key, payload, ts, risk) VALUES (?, ?, ?, ?, ?)", rows
+                )
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        if start is not None:
+            self._observe_flush(start, len(events))
+
+    def transaction(self):
+        """Buffer save_event calls and commit them in one SQLite transaction."""
+        return buffered_transaction(self._pending, self._write)
+
+    def on_rollback(self, callback: Callable[[], None]):
+        """Call ``callback`` if the current transaction is not committed (no-op outside one)."""
+        add_rollback(self._pending, callback)
+
+    def save_event(self, user_id: str, key: str, payload: Any):
+        start = time.perf_counter() if self.metrics.enabled else None
+        batch = self._pending.get()
+        if batch is not None:
+            batch.append((user_id, key, payload))
+        else:
+            self._write([(user_id, key, payload)])
+        if start is not None:
+            self.metrics.histogram(
+                'memory_save_event_seconds', 'Latency of save_event (buffered or flushed).'
+            ).observe(time.perf_counter() - start, backend='sqlite')
+
+    def _observe_flush(self, start: float, events: int):
+        self.metrics.histogram(
+            'memory_flush_seconds', 'Latency of writing one batch of events.'
+        ).observe(time.perf_counter() - start, backend='sqlite')
+        self.metrics.counter(
+            'memory_events_written_total', 'Events written to storage.'
+        ).inc(events, backend='sqlite')
+
+    def get_recent(self, user_id: str, key: str, limit: int = 10) -> List:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT payload FROM events WHERE user_id = ? AND key = ? "
+                "ORDER BY seq DESC LIMIT ?",
+                (user_id, key, limit)
+            ).fetchall()
+        return [{"payload": json.loads(p)} for (p,) in reversed(rows)]
+
+    def get_all(self, user_id: str) -> Dict:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, payload FROM events WHERE user_id = ? ORDER BY seq",
+                (user_id,)
+            ).fetchall()
+        out = {}
+        for key, p in rows:
+            out.setdefault(key, []).append({"payload": json.loads(p)})
+        return out
+
+    def iter_events(self, keys: Optional[Iterable[str]] = None) -> Iterator[Tuple[str, str, Optional[float], Any]]:
+        """``(user_id, key, ts, payload)`` for every event (of ``keys``), in write order."""
+        sql = "SELECT user_id, key, ts, payload FROM events"
+        args: List[Any] = []
+        if keys is not None:
+            args = list(keys)
+            sql += " WHERE key IN (%s)" % ",".join("?" * len(args))
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY seq", args).fetchall()
+        return ((u, k, ts, json.loads(p)) for u, k, ts, p in rows)
+
+    def query(self, key: str, risk: Optional[str] = None, since: Optional[float] = None,
+              until: Optional[float] = None) -> List[Dict]:
+        """Same rows as Memory.query, read through the (key, risk, ts) index."""
+        sql = "SELECT user_id, risk, ts, payload FROM events WHERE key = ? AND risk IS NOT NULL"
+        args: List[Any] = [key]
+        if risk is not None:
+            sql += " AND risk = ?"
+            args.append(getattr(risk, 'value', risk))
+        if since is not None:
+            sql += " AND ts >= ?"
+            args.append(since)
+        if until is not None:
+            sql += " AND ts <= ?"
+            args.append(until)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY ts, user_id", args).fetchall()
+        return [{"user_id": u, "key": key, "risk": r, "ts": ts, "payload": json.loads(p)}
+                for u, r, ts, p in rows]
+
+    def users_with_risk(self, key: str, risk: str, since: Optional[float] = None,
+                        until: Optional[float] = None) -> List[str]:
+        """Sorted ids of users with at least one ``risk`` event of ``key`` in [since, until]."""
+        sql = "SELECT DISTINCT user_id FROM events WHERE key = ? AND risk = ?"
+        args: List[Any] = [key, getattr(risk, 'value', risk)]
+        if since is not None:
+            sql += " AND ts >= ?"
+            args.append(since)
+        if until is not None:
+            sql += " AND ts <= ?"
+            args.append(until)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY user_id", args).fetchall()
+        return [u for (u,) in rows]
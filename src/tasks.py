@@ -0,0 +1,126 @@
+# src/tasks.py
+import heapq
+import json
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from src.tools import parse_start, to_minutes
+
+DEFAULT_PRIORITY = 5
+DEFAULT_DURATION_MIN = 30
+
+
+def normalize_task(task) -> Dict:
+    """Plain-string tasks become ``{"title", "priority", "start_time"}`` dicts."""
+    if isinstance(task, str):
+        return {"title": task, "priority": DEFAULT_PRIORITY, "start_time": "TBD"}
+    return task
+
+
+def task_key(task) -> str:
+    """Identity of a task across runs (the task itself as canonical JSON, so it can be stored)."""
+    return json.dumps(task, sort_keys=True, separators=(',', ':'), default=str)
+
+
+def urgency(task: Dict) -> Tuple:
+    """Sort key: priority, then earliest due date (undated last), then shortest duration."""
+    due = parse_start(task.get('due'))
+    return (
+        task.get('priority', DEFAULT_PRIORITY),
+        to_minutes(due) if due is not None else float('inf'),
+        task.get('duration_min', DEFAULT_DURATION_MIN),
+    )
+
+
+class TaskQueue:
+    """
+    One user's not-yet-scheduled tasks as a binary heap ordered by
+    ``urgency`` (ties keep submission order).
+
+    ``sync`` takes the user's full current task list: tasks not seen before
+    are pushed (O(log n) each), tasks no longer listed are dropped lazily and
+    skipped when they reach the top. ``pop`` removes the k most urgent
+    tasks; they are remembered as scheduled and not offered again that day.
+
+    ``booked`` holds the (task, calendar event) pairs booked on ``day``.
+    ``start_day`` clears it when the date changes and forgets what was
+    scheduled, so tasks still listed are offered again from the next
+    ``sync`` (call it before syncing). ``state`` / ``from_state``
+    round-trip what cannot be rebuilt from the task list (scheduled tasks and
+    today's bookings) through plain JSON; ``dirty`` is set whenever that
+    changes (the owner clears it once saved).
+    """
+    def __init__(self):
+        self._heap: List[Tuple] = []
+        self._seq = 0
+        self._pending: Set[str] = set()
+        self._scheduled: Set[str] = set()
+        self.day: Optional[str] = None
+        self.booked: List[Tuple[Dict, Dict]] = []
+        self.dirty = False
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def sync(self, tasks: Iterable):
+        current = {}
+        for task in tasks:
+            current.setdefault(task_key(task), task)
+        for key, task in current.items():
+            if key in self._pending or key in self._scheduled:
+                continue
+            task = normalize_task(task)
+            heapq.heappush(self._heap, (urgency(task), self._seq, key, task))
+            self._seq += 1
+            self._pending.add(key)
+        self._pending.intersection_update(current)
+        if not self._scheduled <= current.keys():
+            self._scheduled.intersection_update(current)
+            self.dirty = True
+        # rebuild once stale entries dominate, so the heap stays O(live tasks)
+        if len(self._heap) > 2 * len(self._pending) + 32:
+            self._heap = [e for e in self._heap if e[2] in self._pending]
+            heapq.heapify(self._heap)
+
+    def pop(self, k: int) -> List[Dict]:
+        out = []
+        while self._heap and len(out) < k:
+            _, _, key, task = heapq.heappop(self._heap)
+            if key not in self._pending:
+                continue
+            self._pending.discard(key)
+            self._scheduled.add(key)
+            out.append(task)
+        if out:
+            self.dirty = True
+        return out
+
+    def peek(self, k: int) -> List[Dict]:
+        """The k most urgent pending tasks, without removing them."""
+        live = (e for e in self._heap if e[2] in self._pending)
+        return [e[3] for e in heapq.nsmallest(k, live)]
+
+    # ------------------------------------------------------------
+    # DAILY BOOKINGS / PERSISTENCE
+    # ------------------------------------------------------------
+    def start_day(self, day: str):
+        if day != self.day:
+            self.day = day
+            self.booked = []
+            self._scheduled.clear()
+            self.dirty = True
+
+    def book(self, task: Dict, event: Dict):
+        self.booked.append((task, event))
+        self.dirty = True
+
+    def state(self) -> Dict:
+        return {"day": self.day, "booked": [list(b) for b in self.booked],
+                "scheduled": sorted(self._scheduled)}
+
+    @classmethod
+    def from_state(cls, state: Dict) -> 'TaskQueue':
+        queue = cls()
+        queue.day = state.get("day")
+        queue.booked = [tuple(b) for b in state.get("booked", [])]
+        queue._scheduled = set(state.get("scheduled", []))
+        return queue
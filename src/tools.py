@@ -1,27 +1,211 @@
 # src/tools.py
-from typing import Dict, List
+import bisect
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
 
 class EmailTool:
-    """Very small email stub for demo. Collects sent messages in-memory."""
-    def __init__(self):
+    """
+    Very small email stub for demo. Collects sent messages in-memory
+    (unless ``keep_sent`` is off, e.g. for long streams).
+    """
+    def __init__(self, keep_sent: bool = True):
         self.sent = []
+        self.keep_sent = keep_sent
 
     def send(self, to_email: str, subject: str, body: str) -> Dict:
         rec = {"to": to_email, "subject": subject, "body": body}
-        self.sent.append(rec)
+        if self.keep_sent:
+            self.sent.append(rec)
         # return status for orchestrator
         return {"status": "ok", "record": rec}
 
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_minutes(when: datetime) -> int:
+    """Naive datetime -> whole minutes since 1970-01-01 (no timezone/DST math)."""
+    return int((when - EPOCH).total_seconds() // 60)
+
+
+def from_minutes(minutes: int) -> datetime:
+    return EPOCH + timedelta(minutes=minutes)
+
+
+def parse_start(start_time) -> Optional[datetime]:
+    """ISO-8601 start time (str or datetime) or None for 'TBD'/unparseable values."""
+    if isinstance(start_time, datetime):
+        return start_time.replace(tzinfo=None)
+    try:
+        return datetime.fromisoformat(start_time).replace(tzinfo=None)
+    except (TypeError, ValueError):
+        return None
+
+
 class CalendarTool:
-    """Calendar stub: stores created events in-memory."""
-    def __init__(self):
+    """
+    Calendar stub: stores created events in-memory.
+
+    Timed events are also indexed per user as sorted, merged busy intervals
+    (minute resolution), so ``is_free`` is a binary search and
+    ``next_free_slot`` only walks the intervals it has to skip. Free slots
+    are aligned to ``slot_min`` and kept inside ``work_hours`` (None = any
+    time of day). With ``keep_events`` off only the busy index is kept, and
+    ``prune`` drops the part of it that is already over.
+    """
+    def __init__(self, work_hours: Optional[Tuple[int, int]] = (9, 18), slot_min: int = 15,
+                 clock: Callable[[], datetime] = datetime.now, keep_events: bool = True):
         self.events = []
+        self.work_hours = work_hours
+        self.slot_min = slot_min
+        self.clock = clock
+        self.keep_events = keep_events
+        # user_id -> (interval starts, interval ends), disjoint and sorted
+        self._busy: Dict[str, Tuple[List[int], List[int]]] = {}
+        self._lock = threading.Lock()
 
     def create_event(self, user_id: str, title: str, start_time: str, duration_min: int = 30) -> Dict:
         ev = {"user": user_id, "title": title, "start": start_time, "duration": duration_min}
-        self.events.append(ev)
+        with self._lock:
+            self._add(ev)
+        return {"status": "ok", "event": ev}
+
+    def add_events(self, events: List[Dict]) -> List[Dict]:
+        """
+        Append (and index) events recorded by another CalendarTool. Returns
+        the timed events that overlap something already booked here.
+        """
+        conflicts = []
+        with self._lock:
+            for ev in events:
+                start = parse_start(ev.get("start"))
+                if start is not None:
+                    lo = to_minutes(start)
+                    hi = lo + int(ev.get("duration") or 0)
+                    if hi > lo and not self._free(ev["user"], lo, hi):
+                        conflicts.append(ev)
+                self._add(ev)
+        return conflicts
+
+    def schedule(self, user_id: str, title: str, duration_min: int = 30,
+                 after: Optional[datetime] = None) -> Dict:
+        """Book ``title`` into the user's next free slot at or after ``after`` (default: now)."""
+        with self._lock:
+            start = self._next_free(user_id, duration_min, after if after is not None else self.clock())
+            ev = {"user": user_id, "title": title,
+                  "start": start.isoformat(timespec='minutes'), "duration": duration_min}
+            self._add(ev)
         return {"status": "ok", "event": ev}
 
+    def is_free(self, user_id: str, start: datetime, duration_min: int) -> bool:
+        """True if nothing booked for ``user_id`` overlaps [start, start + duration)."""
+        lo = to_minutes(start)
+        with self._lock:
+            return self._free(user_id, lo, lo + duration_min)
+
+    def next_free_slot(self, user_id: str, duration_min: int, after: Optional[datetime] = None) -> datetime:
+        """Earliest aligned start >= ``after`` where ``duration_min`` fits without conflicts."""
+        with self._lock:
+            return self._next_free(user_id, duration_min, after if after is not None else self.clock())
+
+    def prune(self, before: datetime):
+        """
+        Forget busy intervals that end at or before ``before`` (e.g. the
+        start of today); bookings later requested before it are not checked.
+        """
+        cut = to_minutes(before)
+        with self._lock:
+            for user_id, (starts, ends) in list(self._busy.items()):
+                i = bisect.bisect_right(ends, cut)
+                if i == len(ends):
+                    del self._busy[user_id]
+                elif i:
+                    del starts[:i], ends[:i]
+
+    def forget(self, user_id: str):
+        """Drop ``user_id``'s busy intervals."""
+        with self._lock:
+            self._busy.pop(user_id, None)
+
+    def _add(self, ev: Dict):
+        if self.keep_events:
+            self.events.append(ev)
+        start = parse_start(ev.get("start"))
+        if start is None:
+            return
+        lo = to_minutes(start)
+        hi = lo + int(ev.get("duration") or 0)
+        if hi <= lo:
+            return
+        starts, ends = self._busy.setdefault(ev["user"], ([], []))
+        # merge with every interval that overlaps or touches [lo, hi)
+        i = bisect.bisect_left(ends, lo)
+        j = bisect.bisect_right(starts, hi)
+        if i < j:
+            lo = min(lo, starts[i])
+            hi = max(hi, ends[j - 1])
+        starts[i:j] = [lo]
+        ends[i:j] = [hi]
+
+    def _free(self, user_id: str, lo: int, hi: int) -> bool:
+        busy = self._busy.get(user_id)
+        if busy is None:
+            return True
+        starts, ends = busy
+        i = bisect.bisect_right(ends, lo)
+        return i == len(starts) or starts[i] >= hi
+
+    def _next_free(self, user_id: str, duration_min: int, after: datetime) -> datetime:
+        if self.work_hours is not None:
+            day_open, day_close = (h * 60 for h in self.work_hours)
+            if duration_min > day_close - day_open:
+                raise ValueError(f"{duration_min} min does not fit in work hours {self.work_hours}")
+        step = self.slot_min
+        t = -(-to_minutes(after) // step) * step
+        starts, ends = self._busy.get(user_id, ([], []))
+        while True:
+            if self.work_hours is not None:
+                day = t - t % 1440
+                if t < day + day_open:
+                    t = day + day_open
+                elif t + duration_min > day + day_close:
+                    t = day + 1440 + day_open
+            # first busy interval ending after t; if it starts before the slot ends, skip past it
+            i = bisect.bisect_right(ends, t)
+            if i == len(starts) or starts[i] >= t + duration_min:
+                return from_minutes(t)
+            t = -(-ends[i] // step) * step
+
+class AsyncEmailTool(EmailTool):
+    """Async email stub; ``latency`` simulates the SMTP round-trip."""
+    def __init__(self, latency: float = 0.0, keep_sent: bool = True):
+        super().__init__(keep_sent)
+        self.latency = latency
+
+    async def send(self, to_email: str, subject: str, body: str) -> Dict:
+        import asyncio
+        await asyncio.sleep(self.latency)
+        return super().send(to_email, subject, body)
+
+class AsyncCalendarTool(CalendarTool):
+    """Async calendar stub; ``latency`` simulates the calendar API call."""
+    def __init__(self, latency: float = 0.0, **options):
+        super().__init__(**options)
+        self.latency = latency
+
+    async def create_event(self, user_id: str, title: str, start_time: str, duration_min: int = 30) -> Dict:
+        import asyncio
+        await asyncio.sleep(self.latency)
+        return super().create_event(user_id, title, start_time, duration_min)
+
+    async def schedule(self, user_id: str, title: str, duration_min: int = 30,
+                       after: Optional[datetime] = None) -> Dict:
+        import asyncio
+        # reserve first, then wait: concurrent runs for one user never double-book
+        res = super().schedule(user_id, title, duration_min, after)
+        await asyncio.sleep(self.latency)
+        return res
+
 def summarize_plan(plan_items: List[str]) -> str:
     """Small helper to render human-friendly plan text."""
     return " • ".join(plan_items)
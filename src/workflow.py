@@ -1,7 +1,13 @@
 # src/workflow.py
-from typing import Dict
+from contextlib import contextmanager, nullcontext
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
 from src.agent import Agent
-from src.memory import Memory
+from src.memory import EncodedBatch, Memory
+from src.tools import CalendarTool
+from src.results import to_plain
+import json
+import sys
 import time
 
 class WorkflowRunner:
@@ -10,19 +16,218 @@ class WorkflowRunner:
     For demo: runs the agent for a user snapshot and returns the result.
     In a real hackathon you can expand to scheduled loops or A/B simulation.
     """
-    def __init__(self):
-        self.memory = Memory()
+    def __init__(self, memory: Optional[Memory] = None):
+        self.memory = memory if memory is not None else Memory()
         self.agent = Agent(self.memory)
+        # process-mode bookings that overlapped existing ones when merged
+        self.calendar_conflicts: List[Dict] = []
 
     def run_once(self, snapshot: Dict) -> Dict:
         # run orchestrator and return results
         return self.agent.run(snapshot)
 
-    def run_batch(self, snapshots: list):
-        results = {}
-        for s in snapshots:
-            uid = s.get('user_id', 'unknown')
-            results[uid] = self.run_once(s)
-            # small delay to simulate scheduling / traces
-            time.sleep(0.05)
-        return results
+    def run_batch(self, snapshots: list, chunk_size: int = 0, workers: int = 1,
+                  executor: str = 'thread', pace: float = 0.0):
+        """
+        Run every snapshot; results are keyed by user_id in input order.
+
+        Snapshots are split into chunks of ``chunk_size`` and each chunk's
+        memory writes are committed at once (0 = one commit for the whole
+        batch when sequential, ~4 chunks per worker when parallel). With
+        ``workers > 1`` chunks run on a ``'thread'`` or ``'process'`` pool;
+        all snapshots of one user then go to the same chunk, in input order,
+        so repeated users behave like sequential ``run_once`` calls.
+        Process workers run an Agent with this agent's settings (incremental,
+        top_k, calendar work hours and clock, which must be picklable),
+        starting from its per-user state and its bookings for their users.
+        Their events, emails (sent through this agent's email tool),
+        bookings and state are merged back in chunk order; a booking that
+        overlaps one made meanwhile is kept and listed in ``calendar_conflicts``.
+        ``pace`` sleeps that many seconds after each user, to throttle traces.
+        """
+        if workers > 1 and not chunk_size:
+            chunk_size = -(-len(snapshots) // (workers * 4))
+        step = chunk_size or max(len(snapshots), 1)
+        if workers > 1:
+            order = _group_by_user(snapshots, step)
+        else:
+            order = [list(range(i, min(i + step, len(snapshots)))) for i in range(0, len(snapshots), step)]
+        chunks = [[snapshots[i] for i in idx] for idx in order]
+
+        if workers <= 1:
+            outputs = [self._run_chunk(c, pace) for c in chunks]
+        elif executor == 'thread':
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                outputs = list(pool.map(self._run_chunk, chunks, [pace] * len(chunks)))
+        elif executor == 'process':
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                outputs = []
+                options = _agent_options(self.agent)
+                users = [{s.get('user_id', 'anonymous') for s in c} for c in chunks]
+                # user_state first: it puts bookings saved by earlier processes on the calendar
+                states = [self.agent.user_state(u) for u in users]
+                booked: Dict[str, List[Dict]] = {}
+                for ev in self.agent.calendar.events:
+                    booked.setdefault(ev["user"], []).append(ev)
+                seeds = [(state, [ev for uid in u for ev in booked.get(uid, [])])
+                         for state, u in zip(states, users)]
+                results = pool.map(_run_chunk_isolated, chunks, [pace] * len(chunks),
+                                   [options] * len(chunks), seeds)
+                for i, (out, events, sent, calendar, state) in enumerate(results, 1):
+                    # workers interned and encoded the events; one checkpoint at the end at most
+                    self._save_encoded(events, checkpoint=i == len(chunks))
+                    for rec in sent:
+                        self.agent.email.send(rec["to"], rec["subject"], rec["body"])
+                    self.calendar_conflicts.extend(self.agent.calendar.add_events(calendar))
+                    self.agent.load_user_state(state)
+                    outputs.append(out)
+        else:
+            raise ValueError(f"unknown executor: {executor!r}")
+
+        flat = [None] * len(snapshots)
+        for idx, out in zip(order, outputs):
+            for i, r in zip(idx, out):
+                flat[i] = r
+        return {s.get('user_id', 'unknown'): r for s, r in zip(snapshots, flat)}
+
+    def run_stream(self, snapshots: Iterable[Dict], sink: Optional[TextIO] = None,
+                   chunk_size: int = 100, max_users: int = 1000) -> Iterator[Tuple[str, Dict]]:
+        """
+        Lazily run snapshots from any iterable (e.g. ``iter_jsonl``) and yield
+        ``(user_id, result)`` pairs in input order. At most ``chunk_size``
+        snapshots are held at once; each chunk is committed to memory before
+        its results are yielded and written to ``sink`` as JSON lines.
+
+        While streaming, the agent keeps per-user state for at most
+        ``max_users`` users (evicted users' calendar slots are dropped and
+        reloaded from memory when they return), its email and calendar tools
+        keep no records, and past days' slots are pruned. Memory use is then
+        bounded apart from the memory backend (SqliteMemory keeps nothing in RAM).
+        """
+        with self._streaming(max_users):
+            it = iter(snapshots)
+            while True:
+                chunk = list(islice(it, chunk_size))
+                if not chunk:
+                    return
+                calendar = self.agent.calendar
+                calendar.prune(calendar.clock().replace(hour=0, minute=0, second=0, microsecond=0))
+                for s, r in zip(chunk, self._run_chunk(chunk)):
+                    uid = s.get('user_id', 'unknown')
+                    if sink is not None:
+                        sink.write(json.dumps({"user_id": uid, "result": to_plain(r)}) + '\n')
+                    yield uid, r
+
+    @contextmanager
+    def _streaming(self, max_users: int):
+        """Bound the agent's per-user state and stop tool records for the duration of a stream."""
+        agent = self.agent
+        flags = [(tool, name, getattr(tool, name))
+                 for tool, name in ((agent.email, 'keep_sent'), (agent.calendar, 'keep_events'))
+                 if hasattr(tool, name)]
+        limit = agent.max_users
+        agent.max_users = min(limit, max_users)
+        for tool, name, _ in flags:
+            setattr(tool, name, False)
+        try:
+            yield
+        finally:
+            agent.max_users = limit
+            for tool, name, value in flags:
+                setattr(tool, name, value)
+
+    def _save_encoded(self, batch: EncodedBatch, checkpoint: bool):
+        write = getattr(self.memory, 'write_encoded', None)
+        if write is not None:
+            write(batch, checkpoint)
+            return
+        with self.memory.transaction():
+            for e in batch.decoded():
+                self.memory.save_event(*e)
+
+    def _run_chunk(self, chunk: List[Dict], pace: float = 0.0) -> List[Dict]:
+        out = []
+        with self.memory.transaction():
+            for s in chunk:
+                out.append(self.run_once(s))
+                if pace:
+                    time.sleep(pace)
+        return out
+
+
+class _EventRecorder:
+    """
+    Memory stand-in used by process workers to ship events back, interned
+    and encoded so the parent only appends them to its log.
+    """
+    def __init__(self):
+        self.events = EncodedBatch()
+        self._by_key: Dict[Tuple[str, str], List] = {}
+
+    def transaction(self):
+        return nullcontext()
+
+    def on_rollback(self, callback):
+        pass  # a failing worker fails the whole batch
+
+    def save_event(self, user_id: str, key: str, payload):
+        self.events.add(user_id, key, payload)
+        self._by_key.setdefault((user_id, key), []).append({"payload": payload})
+
+    def get_recent(self, user_id: str, key: str, limit: int = 10) -> List:
+        """Events this worker recorded (the agent reads back its own task queues)."""
+        return self._by_key.get((user_id, key), [])[-limit:]
+
+
+def _group_by_user(snapshots: List[Dict], step: int) -> List[List[int]]:
+    """Indices of ``snapshots`` in chunks of about ``step``, never splitting one user's snapshots."""
+    chunk_of: Dict[str, int] = {}
+    chunks: List[List[int]] = []
+    for i, s in enumerate(snapshots):
+        uid = s.get('user_id', 'anonymous')
+        c = chunk_of.get(uid)
+        if c is None:
+            if not chunks or len(chunks[-1]) >= step:
+                chunks.append([])
+            c = chunk_of[uid] = len(chunks) - 1
+        chunks[c].append(i)
+    return chunks
+
+
+def _agent_options(agent: Agent) -> Dict:
+    """What a process worker needs to build an Agent that behaves like ``agent``."""
+    return {
+        "incremental": agent.incremental, "top_k": agent.top_k, "max_users": agent.max_users,
+        "work_hours": agent.calendar.work_hours, "slot_min": agent.calendar.slot_min,
+        "clock": agent.calendar.clock,
+    }
+
+
+def _run_chunk_isolated(chunk: List[Dict], pace: float, options: Dict, seed: Tuple[Dict, List[Dict]]):
+    state, booked = seed
+    recorder = _EventRecorder()
+    runner = WorkflowRunner(recorder)
+    agent = runner.agent = Agent(recorder, incremental=options["incremental"], top_k=options["top_k"],
+                                 max_users=options["max_users"])
+    agent.calendar = CalendarTool(options["work_hours"], options["slot_min"], options["clock"])
+    agent.calendar.add_events(booked)
+    agent.load_user_state(state)
+    out = runner._run_chunk(chunk, pace)
+    users = {s.get('user_id', 'anonymous') for s in chunk}
+    # only what this worker added goes back
+    return (out, recorder.events, agent.email.sent, agent.calendar.events[len(booked):],
+            agent.user_state(users))
+
+
+def iter_jsonl(source: str) -> Iterator[Dict]:
+    """Yield one snapshot per line of a JSONL file ('-' reads stdin)."""
+    f = sys.stdin if source == '-' else open(source, 'r')
+    try:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+    finally:
+        if f is not sys.stdin:
+            f.close()
@@ -0,0 +1,154 @@
+# tests/test_outbox.py
+import email
+import socketserver
+import threading
+
+import pytest
+
+from src.metrics import MetricsRegistry
+from src.outbox import Outbox, SmtpTransport
+
+
+class StubSmtpServer(socketserver.ThreadingTCPServer):
+    """
+    Just enough SMTP for smtplib. Delivered messages land in ``received``;
+    ``reject`` holds recipients refused at RCPT, and the first connection is
+    dropped after ``drop_after`` messages (0 = never).
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, drop_after: int = 0, reject=()):
+        super().__init__(('127.0.0.1', 0), StubSmtpHandler)
+        self.drop_after = drop_after
+        self.reject = set(reject)
+        self.received = []
+        self.connections = 0
+        self.lock = threading.Lock()
+
+
+class StubSmtpHandler(socketserver.StreamRequestHandler):
+    def reply(self, line: str):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+            first = server.connections == 1
+        delivered = 0
+        self.reply('220 stub ESMTP')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            verb = line[:4].upper()
+            if verb in (b'EHLO', b'HELO'):
+                self.reply('250 stub')
+            elif verb == b'RCPT':
+                rcpt = line.decode().split(':', 1)[1].strip().strip('<>')
+                self.reply('550 rejected' if rcpt in server.reject else '250 ok')
+            elif verb == b'DATA':
+                self.reply('354 go ahead')
+                data = b''.join(iter(self.rfile.readline, b'.\r\n'))
+                with server.lock:
+                    server.received.append(email.message_from_bytes(data))
+                self.reply('250 queued')
+                delivered += 1
+                if first and delivered == server.drop_after:
+                    return
+            elif verb == b'QUIT':
+                self.reply('221 bye')
+                return
+            else:  # MAIL, RSET, NOOP
+                self.reply('250 ok')
+
+
+@pytest.fixture
+def smtp():
+    servers = []
+
+    def start(**kwargs) -> StubSmtpServer:
+        server = StubSmtpServer(**kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def make_outbox(server: StubSmtpServer, **kwargs) -> Outbox:
+    transport = SmtpTransport('127.0.0.1', server.server_address[1], timeout=5.0)
+    return Outbox(transport, metrics=MetricsRegistry(), **kwargs)
+
+
+def test_batches_over_one_connection(smtp, monkeypatch):
+    server = smtp()
+    # a long digest window keeps everything queued until flush
+    outbox = make_outbox(server, batch_size=2, digest_window=60.0)
+    batches = []
+    send_batch = outbox.transport.send_batch
+    monkeypatch.setattr(outbox.transport, 'send_batch',
+                        lambda messages: (batches.append(len(messages)), send_batch(messages)))
+    for i in range(5):
+        outbox.send(f"user{i}@example.com", f"alert {i}", "body")
+    assert outbox.flush(timeout=5)
+    outbox.close(timeout=5)
+    assert batches == [2, 2, 1]
+    assert [m['To'] for m in server.received] == [f"user{i}@example.com" for i in range(5)]
+    assert server.connections == 1
+    assert outbox.failed == []
+
+
+def test_digest_coalesces_one_recipient(smtp):
+    server = smtp()
+    outbox = make_outbox(server, digest_window=60.0)
+    for i in range(3):
+        outbox.send("a@example.com", f"alert {i}", f"body {i}")
+    outbox.close(timeout=5)
+    assert len(server.received) == 1
+    msg = server.received[0]
+    assert msg['Subject'] == "alert 2 (3 updates)"
+    assert all(f"body {i}" in msg.get_payload() for i in range(3))
+
+
+def test_rate_limit_holds_back_until_close(smtp):
+    server = smtp()
+    outbox = make_outbox(server, rate_limit=1, rate_period=60.0)
+    outbox.send("a@example.com", "first", "1")
+    assert outbox.flush(timeout=5)
+    outbox.send("a@example.com", "second", "2")
+    outbox.send("a@example.com", "third", "3")
+    assert outbox.flush(timeout=5)
+    assert outbox.pending() == 2
+    outbox.close(timeout=5)
+    assert [m['Subject'] for m in server.received] == ["first"]
+    assert [m['subject'] for m in outbox.failed] == ["third (2 updates)"]
+
+
+def test_reconnects_after_dropped_connection(smtp):
+    server = smtp(drop_after=1)
+    outbox = make_outbox(server, digest_window=60.0)
+    for i in range(3):
+        outbox.send(f"user{i}@example.com", f"alert {i}", "body")
+    outbox.close(timeout=5)
+    assert [m['Subject'] for m in server.received] == ["alert 0", "alert 1", "alert 2"]
+    assert server.connections == 2
+    assert outbox.failed == []
+
+
+def test_partial_failure_keeps_only_undelivered(smtp):
+    server = smtp(reject={"bad@example.com"})
+    outbox = make_outbox(server, digest_window=60.0)
+    outbox.metrics.enabled = True
+    for to in ("ok@example.com", "bad@example.com", "later@example.com"):
+        outbox.send(to, "alert", "body")
+    outbox.close(timeout=5)
+    assert [m['To'] for m in server.received] == ["ok@example.com"]
+    assert [m['to'] for m in outbox.failed] == ["bad@example.com", "later@example.com"]
+    counts = {name: sum(outbox.metrics.counter(name, '').values.values())
+              for name in ('outbox_sent_total', 'outbox_failed_total')}
+    assert counts == {'outbox_sent_total': 1, 'outbox_failed_total': 2}
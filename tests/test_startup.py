@@ -0,0 +1,17 @@
+# tests/test_startup.py
+import os
+
+from benchmarks.run import STARTUP_IMPORTS, bench_startup, check_startup
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_startup_imports_stay_lazy(monkeypatch):
+    monkeypatch.chdir(ROOT)  # the subprocesses import main/src from the project root
+    results = {}
+    loaded = bench_startup(results, runs=1)
+    assert loaded == []
+    for module in STARTUP_IMPORTS:
+        assert results[f"startup.import.{module}"]["value"] > 0
+    # generous budget: catches eager heavy imports, not machine noise
+    assert check_startup(results, loaded, budget=0.5)